@@ -0,0 +1,91 @@
+import json
+import random
+from pathlib import Path
+
+FIXTURES_DIR = Path(__file__).parent / 'fixtures'
+HOTELS_PAGE_SIZE = 25
+
+
+def load_fixtures(pattern: str = 'properties_list_*.json') -> dict[str, bytes]:
+    """
+    Возвращает записанные ответы rapidapi из benchmarks/fixtures в виде байтов.
+    Если записанных ответов нет, возвращает сгенерированные страницы того же формата
+    """
+    fixtures = {path.name: path.read_bytes() for path in sorted(FIXTURES_DIR.glob(pattern))}
+    if fixtures:
+        return fixtures
+    return {f'generated_page_{page}.json': json.dumps(generate_hotels_page(page)).encode() for page in range(1, 4)}
+
+
+def generate_hotels_page(page: int, size: int = HOTELS_PAGE_SIZE, seed: int = 0) -> dict:
+    """
+    Генерирует страницу ответа properties/list со всеми полями, которые возвращает rapidapi,
+    включая те, что боту не нужны. Отели отсортированы по расстоянию до центра
+    """
+    generator = random.Random(f'{seed}:{page}')
+    results = [generate_hotel_result(generator, hotel_id=page * 1000 + index,
+                                     distance=round(0.1 * ((page - 1) * size + index + 1), 1))
+               for index in range(size)]
+    return {
+        'result': 'OK',
+        'data': {'body': {
+            'header': 'Moscow, Russia',
+            'query': {'destination': {'id': '1153093', 'value': 'Moscow', 'resolvedLocation': 'CITY:1153093:UNKNOWN'}},
+            'searchResults': {
+                'totalCount': 1500,
+                'results': results,
+                'pagination': {'currentPage': page, 'pageGroup': 'EXPEDIA_IN_POLYGON',
+                               'nextPageStartIndex': page * size, 'nextPageNumber': page + 1,
+                               'nextPageGroup': 'EXPEDIA_IN_POLYGON'},
+            },
+            'sortResults': {'options': [{'label': label, 'itemMeta': 'popular', 'choices': [
+                {'label': choice, 'value': choice.upper(), 'selected': False} for choice in ('asc', 'desc')]}
+                for label in ('Featured', 'Price', 'Distance', 'Guest rating', 'Star rating')]},
+            'filters': {'name': {'item': {'value': ''}}, 'starRating': {'applied': False, 'items': [
+                {'value': str(stars)} for stars in range(1, 6)]}, 'price': {'label': 'Price', 'range': {
+                    'min': {'defaultValue': 0}, 'max': {'defaultValue': 1000}}, 'multiplier': 1}},
+            'pointOfSale': {'currency': {'code': 'USD', 'symbol': '$', 'separators': ',.', 'format': '${0}'}},
+        }},
+    }
+
+
+def generate_hotel_result(generator: random.Random, hotel_id: int, distance: float) -> dict:
+    """ Генерирует один результат поиска отелей """
+    price = round(generator.uniform(20, 400), 2)
+    return {
+        'id': hotel_id,
+        'name': f'Hotel {hotel_id}',
+        'starRating': float(generator.randint(0, 5)),
+        'urls': {},
+        'address': {
+            'streetAddress': f'{generator.randint(1, 200)} Tverskaya street', 'extendedAddress': '',
+            'locality': 'Moscow', 'postalCode': '125009', 'region': '', 'countryName': 'Russia',
+            'countryCode': 'RU', 'obfuscate': False,
+        },
+        'guestReviews': {'unformattedRating': round(generator.uniform(5, 10), 1), 'rating': '8.6',
+                         'total': generator.randint(0, 3000), 'scale': 10, 'badge': 'fabulous',
+                         'badgeText': 'Fabulous'},
+        'landmarks': [{'label': 'City center', 'distance': f'{distance} miles'},
+                      {'label': 'Red Square', 'distance': f'{round(distance + 0.4, 1)} miles'}],
+        'ratePlan': {
+            'price': {'current': f'${round(price)}', 'exactCurrent': price, 'old': f'${round(price * 1.2)}',
+                      'info': 'nightly price per room', 'summary': 'The price is $0 per night'},
+            'features': {'freeCancellation': generator.random() < 0.5, 'paymentPreference': False,
+                         'noCCRequired': False},
+            'type': 'EC',
+        },
+        'neighbourhood': 'Tverskoy',
+        'deals': {'specialDeal': {'dealText': 'Save 20%'}, 'priceReasoning': 'DRR-445'},
+        'messaging': {'scarcity': 'We have 2 left'},
+        'badging': {'hotelBadge': {'type': 'vipBadge', 'label': 'VIP Access'}},
+        'pimmsAttributes': 'DoubleStamps|MESOTESTUS|TESCO',
+        'coordinate': {'lat': round(55.75 + generator.uniform(-0.1, 0.1), 6),
+                       'lon': round(37.61 + generator.uniform(-0.1, 0.1), 6)},
+        'roomsLeft': generator.randint(0, 10),
+        'providerType': 'LOCAL',
+        'supplierHotelId': generator.randint(1000000, 9999999),
+        'vrBadge': None,
+        'isAlternative': False,
+        'optimizedThumbUrls': {
+            'srpDesktop': f'https://exp.cdn-hotels.com/hotels/1000000/{hotel_id}/{hotel_id}_250_140.jpg'},
+    }
@@ -0,0 +1,62 @@
+import json
+import sys
+import timeit
+import tracemalloc
+from typing import Callable
+
+from benchmarks.fixtures import load_fixtures
+from tgbot.rapidapi import json_decoding
+from tgbot.rapidapi.json_decoding import dumps, loads, project_hotel_result, select_hotels_fields, stream_hotels_page
+
+REPEAT = 5
+
+
+def decode_as_text(body: bytes) -> dict:
+    """ Текущий путь: aiohttp response.json() декодирует тело в строку и разбирает ее стандартным json """
+    return json.loads(body.decode('utf-8'))
+
+
+def get_decoders() -> dict[str, Callable[[bytes], dict]]:
+    decoders = {'stdlib json (current)': decode_as_text}
+    if json_decoding.orjson is not None:
+        decoders['orjson'] = loads
+    decoders['selective'] = select_hotels_fields
+    if json_decoding.ijson is not None:
+        decoders[f'ijson streaming ({json_decoding.ijson.backend})'] = stream_hotels_page
+    return decoders
+
+
+def measure(decode: Callable[[bytes], dict], bodies: list[bytes], number: int) -> tuple[float, float]:
+    """ Возвращает лучшее время декодирования одной страницы в мкс и пик выделенной памяти в КиБ """
+    best = min(timeit.repeat(lambda: [decode(body) for body in bodies], number=number, repeat=REPEAT))
+    tracemalloc.start()
+    for body in bodies:
+        decode(body)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best / number / len(bodies) * 1e6, peak / 1024
+
+
+def needed_fields(page: dict) -> list[dict]:
+    return [project_hotel_result(result) for result in page['data']['body']['searchResults']['results']]
+
+
+def main(number: int):
+    fixtures = load_fixtures()
+    bodies = list(fixtures.values())
+    print(f'fixtures: {", ".join(fixtures)} ({sum(map(len, bodies)) // len(bodies)} bytes per page)')
+    expected = [needed_fields(decode_as_text(body)) for body in bodies]
+    baseline = None
+    for name, decode in get_decoders().items():
+        if [needed_fields(decode(body)) for body in bodies] != expected:
+            print(f'{name}: results differ from stdlib json')
+            continue
+        per_page, peak = measure(decode, bodies, number)
+        baseline = baseline or per_page
+        retained = len(dumps(decode(bodies[0]))) / 1024
+        print(f'{name:<32} {per_page:>9.1f} us/page {baseline / per_page:>6.2f}x  '
+              f'peak {peak:>8.1f} KiB  retained {retained:>6.1f} KiB/page')
+
+
+if __name__ == '__main__':
+    main(number=int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -0,0 +1,131 @@
+import itertools
+import json
+import time
+import zlib
+from collections import Counter, defaultdict
+from typing import Optional
+
+from aiohttp import web
+
+BOT_USER = {'id': 100000, 'is_bot': True, 'first_name': 'HotelBookingBot', 'username': 'hotel_booking_loadtest_bot'}
+
+SEND_METHODS = {'sendMessage', 'sendPhoto', 'sendLocation'}
+EDIT_METHODS = {'editMessageText', 'editMessageReplyMarkup', 'editMessageMedia', 'editMessageCaption'}
+
+
+class FakeBotApi:
+    """
+    Сервер Bot API для нагрузочного теста. Запоминает сообщения бота в каждом чате,
+    чтобы симулированные пользователи могли нажимать на кнопки, и считает вызовы методов
+    """
+    def __init__(self):
+        self.calls: Counter = Counter()
+        self._messages: dict[int, dict[int, dict]] = defaultdict(dict)
+        self._message_ids: dict[int, itertools.count] = defaultdict(lambda: itertools.count(1))
+        self._revisions: dict[int, dict[int, int]] = defaultdict(dict)
+        self._revision = itertools.count(1)
+        self.revision: int = 0
+
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post('/bot{token}/{method}', self.handle_method)
+        return app
+
+    def new_message_id(self, chat_id: int) -> int:
+        """ Выдает номер сообщения в чате. Сообщения пользователя и бота нумеруются вместе """
+        return next(self._message_ids[chat_id])
+
+    def last_message_with_button(self, chat_id: int, prefix: str, since: int = 0) -> Optional[dict]:
+        """
+        Возвращает последнее сообщение бота в чате с кнопкой, данные которой начинаются с prefix.
+        since - учитывать только сообщения, отправленные или измененные после этой ревизии
+        """
+        for message_id in sorted(self._messages[chat_id], reverse=True):
+            message = self._messages[chat_id][message_id]
+            if self._revisions[chat_id][message_id] <= since:
+                continue
+            if any(data.startswith(prefix) for data in callback_data(message)):
+                return message
+        return None
+
+    def forget_chat(self, chat_id: int):
+        self._messages.pop(chat_id, None)
+        self._revisions.pop(chat_id, None)
+
+    def touch(self, chat_id: int, message_id: int):
+        self.revision = next(self._revision)
+        self._revisions[chat_id][message_id] = self.revision
+
+    async def handle_method(self, request: web.Request) -> web.Response:
+        method = request.match_info['method']
+        self.calls[method] += 1
+        data = await request.post()
+        return web.json_response({'ok': True, 'result': self.call(method, data)})
+
+    def call(self, method: str, data) -> object:
+        """ Выполняет метод Bot API и возвращает его результат """
+        if method == 'getMe':
+            return BOT_USER
+        chat_id = int(data['chat_id']) if 'chat_id' in data else None
+        if method in SEND_METHODS:
+            return self.store_message(chat_id, data)
+        if method == 'sendMediaGroup':
+            return [self.store_message(chat_id, {'photo': media.get('media'), 'caption': media.get('caption')})
+                    for media in json.loads(data['media'])]
+        if method in EDIT_METHODS:
+            return self.edit_message(chat_id, int(data['message_id']), data)
+        if method == 'deleteMessage':
+            self._messages[chat_id].pop(int(data['message_id']), None)
+        elif method == 'deleteMessages':
+            for message_id in json.loads(data['message_ids']):
+                self._messages[chat_id].pop(message_id, None)
+        return True
+
+    def store_message(self, chat_id: int, data) -> dict:
+        message = {
+            'message_id': self.new_message_id(chat_id),
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': BOT_USER,
+        }
+        self.apply_content(message, data)
+        self._messages[chat_id][message['message_id']] = message
+        self.touch(chat_id, message['message_id'])
+        return message
+
+    def edit_message(self, chat_id: int, message_id: int, data) -> dict:
+        message = self._messages[chat_id].get(message_id)
+        if message is None:
+            message = {'message_id': message_id, 'date': int(time.time()),
+                       'chat': {'id': chat_id, 'type': 'private'}, 'from': BOT_USER}
+            self._messages[chat_id][message_id] = message
+        if 'reply_markup' not in data:
+            message.pop('reply_markup', None)
+        if 'media' in data:
+            data = {**data, 'photo': json.loads(data['media']).get('media')}
+        self.apply_content(message, data)
+        self.touch(chat_id, message_id)
+        return message
+
+    @staticmethod
+    def apply_content(message: dict, data):
+        if data.get('text') is not None:
+            message['text'] = data['text']
+        if data.get('photo') is not None:
+            photo_hash = f"{zlib.crc32(str(data['photo']).encode()):08x}"
+            message['photo'] = [{'file_id': f'file-{photo_hash}', 'file_unique_id': photo_hash,
+                                 'width': 1280, 'height': 720}]
+        if data.get('caption') is not None:
+            message['caption'] = data['caption']
+        if data.get('latitude') is not None:
+            message['location'] = {'latitude': float(data['latitude']), 'longitude': float(data['longitude'])}
+        if data.get('reply_markup') is not None:
+            reply_markup = json.loads(data['reply_markup'])
+            if 'inline_keyboard' in reply_markup:
+                message['reply_markup'] = reply_markup
+
+
+def callback_data(message: dict) -> list[str]:
+    """ Возвращает данные всех встроенных кнопок сообщения """
+    keyboard = message.get('reply_markup', {}).get('inline_keyboard', [])
+    return [button['callback_data'] for row in keyboard for button in row if 'callback_data' in button]
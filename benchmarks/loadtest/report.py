@@ -0,0 +1,72 @@
+import math
+import resource
+from collections import defaultdict
+
+PERCENTILES = (50, 95, 99)
+
+
+class LoadStats:
+    """ Время обработки обновлений по шагам сценариев и количество ошибок """
+    def __init__(self):
+        self.durations: dict[str, list[float]] = defaultdict(list)
+        self.failures: dict[str, int] = defaultdict(int)
+        self.updates: int = 0
+
+    def record(self, step: str, duration: float, ok: bool):
+        self.updates += 1
+        self.durations[step].append(duration)
+        if not ok:
+            self.failures[step] += 1
+
+
+def percentile(sorted_values: list[float], percent: float) -> float:
+    """ Возвращает перцентиль методом ближайшего ранга """
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(percent / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def peak_rss_mb() -> float:
+    """ Пиковое потребление памяти процессом в МиБ (ru_maxrss в Linux указан в КиБ) """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def build_report(stats: LoadStats, wall_time: float, rapidapi_calls: dict, rate_limited: dict,
+                 bot_api_calls: dict, users: int) -> dict:
+    steps = dict()
+    for step, durations in sorted(stats.durations.items()):
+        durations = sorted(durations)
+        steps[step] = {
+            'count': len(durations),
+            'failures': stats.failures.get(step, 0),
+            **{f'p{percent}_ms': round(percentile(durations, percent) * 1000, 1) for percent in PERCENTILES},
+        }
+    return {
+        'users': users,
+        'updates': stats.updates,
+        'wall_time_s': round(wall_time, 2),
+        'updates_per_s': round(stats.updates / wall_time, 1) if wall_time else 0.0,
+        'steps': steps,
+        'rapidapi_calls': dict(rapidapi_calls),
+        'rapidapi_rate_limited': dict(rate_limited),
+        'bot_api_calls': dict(bot_api_calls),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+    }
+
+
+def format_report(report: dict) -> str:
+    lines = [f"users: {report['users']}  updates: {report['updates']}  wall time: {report['wall_time_s']} s  "
+             f"updates/s: {report['updates_per_s']}  peak RSS: {report['peak_rss_mb']} MiB",
+             '',
+             f"{'step':<28}{'count':>8}{'failed':>8}" + ''.join(f"{f'p{percent} ms':>10}" for percent in PERCENTILES)]
+    for step, step_stats in report['steps'].items():
+        lines.append(f"{step:<28}{step_stats['count']:>8}{step_stats['failures']:>8}"
+                     + ''.join(f"{step_stats[f'p{percent}_ms']:>10}" for percent in PERCENTILES))
+    lines.append('')
+    rate_limited = report['rapidapi_rate_limited']
+    lines.append('rapidapi calls: ' + ', '.join(f'{endpoint} {count} ({rate_limited.get(endpoint, 0)} x 429)'
+                                                for endpoint, count in report['rapidapi_calls'].items()))
+    lines.append('bot api calls: ' + ', '.join(f'{method} {count}'
+                                               for method, count in sorted(report['bot_api_calls'].items())))
+    return '\n'.join(lines)
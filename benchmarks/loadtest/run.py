@@ -0,0 +1,127 @@
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import random
+import time
+
+from aiogram import Bot, Dispatcher
+from aiohttp import web
+
+from benchmarks.loadtest.fake_bot_api import FakeBotApi
+from benchmarks.loadtest.report import LoadStats, build_report, format_report
+from benchmarks.loadtest.stub_rapidapi import StubRapidApi
+from benchmarks.loadtest.users import SimulatedUser, run_bestdeal, run_history, run_lowprice
+
+BOT_TOKEN = '123456:loadtest'
+FIRST_USER_ID = 10 ** 9
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Нагрузочный тест бота с фейковыми RapidAPI и Bot API')
+    parser.add_argument('--users', type=int, default=1000, help='количество одновременных пользователей')
+    parser.add_argument('--ramp-up', type=float, default=10, help='время в секундах, за которое подключаются все')
+    parser.add_argument('--rounds', type=int, default=1, help='сколько раз каждый пользователь проходит сценарии')
+    parser.add_argument('--hotels', type=int, default=5, help='сколько отелей пользователь просматривает в поиске')
+    parser.add_argument('--ranked-share', type=float, default=0.5,
+                        help='доля поисков /bestdeal с минимальным количеством звезд (ранжирование)')
+    parser.add_argument('--latency', type=float, default=0.3, help='средняя задержка RapidAPI в секундах')
+    parser.add_argument('--jitter', type=float, default=0.1, help='разброс задержки RapidAPI в секундах')
+    parser.add_argument('--rate-limit-ratio', type=float, default=0.02, help='доля ответов RapidAPI с кодом 429')
+    parser.add_argument('--keys', type=int, default=5, help='количество ключей RapidAPI')
+    parser.add_argument('--db-uri', default='mongodb://localhost:27017', help='MongoDB для истории поиска')
+    parser.add_argument('--redis', action='store_true', help='использовать Redis (USE_REDIS=True)')
+    parser.add_argument('--delivery-rate', type=float, default=100000,
+                        help='глобальный лимит отправки сообщений в секунду (в Telegram - 30)')
+    parser.add_argument('--json', dest='json_path', help='сохранить отчет в JSON')
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args()
+
+
+def configure_environment(args: argparse.Namespace, bot_api_url: str, rapidapi_url: str):
+    """ Направляет бота на фейковые серверы. Переменные окружения важнее значений из .env """
+    os.environ.update({
+        'BOT_TOKEN': BOT_TOKEN,
+        'ADMINS': '1',
+        'USE_REDIS': str(args.redis),
+        'USE_WEBHOOK': 'False',
+        'WORKERS': '1',
+        'BOT_API_SERVER': bot_api_url,
+        'RAPIDAPI_BASE_URL': rapidapi_url,
+        'RAPID_API_KEYS': ','.join(f'loadtest-key-{index}' for index in range(args.keys)),
+        'DB_URI': args.db_uri,
+        'DELIVERY_GLOBAL_RATE': str(args.delivery_rate),
+        'DELIVERY_GLOBAL_BURST': str(args.delivery_rate),
+    })
+    for name in ('DB_USER', 'DB_PASS', 'DB_NAME', 'DB_HOST'):
+        os.environ.setdefault(name, 'loadtest')
+
+
+async def start_server(app: web.Application) -> tuple[web.AppRunner, str]:
+    """ Запускает веб-приложение на свободном локальном порту и возвращает его адрес """
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    host, port = runner.addresses[0][:2]
+    return runner, f'http://{host}:{port}'
+
+
+async def run_user(user: SimulatedUser, args: argparse.Namespace, delay: float, seed: int):
+    """ Проходит сценарии /lowprice, /bestdeal и /history, начиная через delay секунд """
+    generator = random.Random(seed)
+    await asyncio.sleep(delay)
+    for _ in range(args.rounds):
+        await run_lowprice(user, hotels=args.hotels)
+        min_stars = 4 if generator.random() < args.ranked_share else 0
+        await run_bestdeal(user, hotels=args.hotels, min_stars=min_stars)
+        await run_history(user)
+    user.bot_api.forget_chat(user.user_id)
+
+
+async def run_load_test(args: argparse.Namespace) -> dict:
+    bot_api = FakeBotApi()
+    rapidapi = StubRapidApi(latency=args.latency, jitter=args.jitter, rate_limit_ratio=args.rate_limit_ratio,
+                            seed=args.seed)
+    bot_api_runner, bot_api_url = await start_server(bot_api.create_app())
+    rapidapi_runner, rapidapi_url = await start_server(rapidapi.create_app())
+    configure_environment(args, bot_api_url=bot_api_url, rapidapi_url=rapidapi_url)
+    # main и модули бота читают настройки при импорте, поэтому он импортируется после настройки окружения
+    bot_main = importlib.import_module('main')
+    dispatcher = bot_main.dp
+    Bot.set_current(dispatcher.bot)
+    Dispatcher.set_current(dispatcher)
+    await bot_main.setup_bot(dispatcher)
+
+    stats = LoadStats()
+    users = [SimulatedUser(user_id=FIRST_USER_ID + index, dispatcher=dispatcher, bot_api=bot_api, stats=stats)
+             for index in range(args.users)]
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(run_user(user, args, delay=args.ramp_up * index / max(args.users, 1),
+                                        seed=args.seed + index)
+                               for index, user in enumerate(users)))
+        wall_time = time.perf_counter() - started
+    finally:
+        await bot_main.on_shutdown(dispatcher)
+        await dispatcher.storage.close()
+        await dispatcher.storage.wait_closed()
+        await dispatcher.bot.session.close()
+        await bot_api_runner.cleanup()
+        await rapidapi_runner.cleanup()
+    return build_report(stats, wall_time=wall_time, rapidapi_calls=rapidapi.calls,
+                        rate_limited=rapidapi.rate_limited, bot_api_calls=bot_api.calls, users=args.users)
+
+
+def main():
+    args = parse_args()
+    report = asyncio.run(run_load_test(args))
+    print(format_report(report))
+    if args.json_path:
+        with open(args.json_path, 'w') as file:
+            json.dump(report, file, indent=2, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+import asyncio
+import json
+import random
+from collections import Counter
+
+from aiohttp import web
+
+from benchmarks.fixtures import load_fixtures
+
+DESTINATION_ID = '1153093'
+EMPTY_PAGE = json.dumps({'result': 'OK', 'data': {'body': {'searchResults': {'results': []}}}}).encode()
+RETRY_AFTER = 1
+
+
+class StubRapidApi:
+    """
+    Сервер вместо hotels4.p.rapidapi.com для нагрузочного теста. Отдает записанные ответы properties/list
+    по номеру страницы, добавляя задержку, и отвечает 429 на заданную долю запросов
+    """
+    def __init__(self, latency: float, jitter: float, rate_limit_ratio: float, seed: int = 0):
+        self.latency: float = latency
+        self.jitter: float = jitter
+        self.rate_limit_ratio: float = rate_limit_ratio
+        self.calls: Counter = Counter()
+        self.rate_limited: Counter = Counter()
+        self.pages: list[bytes] = list(load_fixtures().values())
+        self._random = random.Random(seed)
+        self._cities = json.dumps({'suggestions': [{'group': 'CITY_GROUP', 'entities': [
+            {'name': 'Moscow, Russia', 'destinationId': DESTINATION_ID, 'type': 'CITY'}]}]}).encode()
+
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get('/locations/v2/search', self.search_cities)
+        app.router.add_get('/properties/list', self.list_properties)
+        app.router.add_get('/properties/get-hotel-photos', self.get_hotel_photos)
+        return app
+
+    async def respond(self, request: web.Request, body: bytes) -> web.Response:
+        """ Отвечает с задержкой. Часть запросов получает 429, как при исчерпании квоты ключа """
+        endpoint = request.path
+        self.calls[endpoint] += 1
+        await asyncio.sleep(max(self._random.gauss(self.latency, self.jitter), 0))
+        if self._random.random() < self.rate_limit_ratio:
+            self.rate_limited[endpoint] += 1
+            return web.Response(status=429, headers={'Retry-After': str(RETRY_AFTER)})
+        return web.Response(body=body, content_type='application/json',
+                            headers={'X-RateLimit-Requests-Remaining': '100000'})
+
+    async def search_cities(self, request: web.Request) -> web.Response:
+        return await self.respond(request, self._cities)
+
+    async def list_properties(self, request: web.Request) -> web.Response:
+        page = int(request.query.get('pageNumber', 1))
+        body = self.pages[page - 1] if page <= len(self.pages) else EMPTY_PAGE
+        return await self.respond(request, body)
+
+    async def get_hotel_photos(self, request: web.Request) -> web.Response:
+        hotel_id = request.query.get('id')
+        photos = {'hotelId': hotel_id, 'hotelImages': [
+            {'baseUrl': f'https://exp.cdn-hotels.com/hotels/{hotel_id}/{index}_{{size}}.jpg', 'imageId': index}
+            for index in range(10)]}
+        return await self.respond(request, json.dumps(photos).encode())
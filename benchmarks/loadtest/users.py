@@ -0,0 +1,135 @@
+import itertools
+import time
+from typing import Callable, Optional
+
+from aiogram import Dispatcher, types
+
+from benchmarks.loadtest.fake_bot_api import FakeBotApi, callback_data
+from benchmarks.loadtest.report import LoadStats
+
+CITY = 'Moscow'
+MAX_CALENDAR_STEPS = 4
+SHOW_MORE = '➕ Показать еще'
+MAIN_MENU = '🏠 Главное меню'
+
+update_ids = itertools.count(1)
+
+
+class SimulatedUser:
+    """
+    Пользователь нагрузочного теста. Отправляет обновления в настоящий диспетчер бота и нажимает на кнопки
+    из сообщений, которые бот отправил в фейковый Bot API. Время обработки каждого обновления записывается по шагам
+    """
+    def __init__(self, user_id: int, dispatcher: Dispatcher, bot_api: FakeBotApi, stats: LoadStats):
+        self.user_id: int = user_id
+        self.dispatcher: Dispatcher = dispatcher
+        self.bot_api: FakeBotApi = bot_api
+        self.stats: LoadStats = stats
+        self.user = {'id': user_id, 'is_bot': False, 'first_name': f'User {user_id}', 'language_code': 'ru'}
+
+    async def send_text(self, step: str, text: str, expect: Optional[str] = None) -> bool:
+        """ Отправляет боту сообщение. expect - начало данных кнопки, которую бот должен прислать в ответ """
+        message = {
+            'message_id': self.bot_api.new_message_id(self.user_id),
+            'date': int(time.time()),
+            'chat': {'id': self.user_id, 'type': 'private'},
+            'from': self.user,
+            'text': text,
+        }
+        if text.startswith('/'):
+            message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+        return await self.process(step, {'update_id': next(update_ids), 'message': message}, expect)
+
+    async def click(self, step: str, prefix: str, expect: Optional[str] = None,
+                    choose: Callable[[list[str]], str] = lambda buttons: buttons[0]) -> bool:
+        """ Нажимает на кнопку последнего сообщения бота, данные которой начинаются с prefix """
+        message = self.bot_api.last_message_with_button(self.user_id, prefix)
+        if message is None:
+            self.stats.record(step, 0.0, ok=False)
+            return False
+        data = choose([data for data in callback_data(message) if data.startswith(prefix)])
+        callback_query = {
+            'id': str(next(update_ids)),
+            'from': self.user,
+            'message': message,
+            'chat_instance': str(self.user_id),
+            'data': data,
+        }
+        return await self.process(step, {'update_id': next(update_ids), 'callback_query': callback_query}, expect)
+
+    async def process(self, step: str, update: dict, expect: Optional[str]) -> bool:
+        revision, started = self.bot_api.revision, time.perf_counter()
+        try:
+            await self.dispatcher.process_update(types.Update.to_object(update))
+            ok = expect is None or self.bot_api.last_message_with_button(self.user_id, expect,
+                                                                         since=revision) is not None
+        except Exception:
+            ok = False
+        self.stats.record(step, time.perf_counter() - started, ok=ok)
+        return ok
+
+    async def select_dates(self, flow: str) -> bool:
+        """ Выбирает в календаре ближайшую дату заезда и самую дальнюю дату выезда """
+        for date_type, choose in (('date_in', lambda buttons: buttons[0]), ('date_out', lambda buttons: buttons[-1])):
+            for _ in range(MAX_CALENDAR_STEPS):
+                if self.bot_api.last_message_with_button(self.user_id, f'{date_type}_correct') is not None:
+                    break
+                if not await self.click(f'{flow}:calendar', 'cbcal_', choose=lambda buttons: choose(
+                        [data for data in buttons if is_calendar_selection(data)] or buttons)):
+                    return False
+            if not await self.click(f'{flow}:confirm_date', f'{date_type}_correct'):
+                return False
+        return True
+
+
+def is_calendar_selection(data: str) -> bool:
+    """ Проверяет, выбирает ли кнопка календаря год, месяц или день (а не листает календарь) """
+    parts = data.split('_')
+    return len(parts) > 2 and parts[2] == 's'
+
+
+async def run_lowprice(user: SimulatedUser, hotels: int) -> bool:
+    """ /lowprice: город, даты, первый отель, следующие отели и фотографии отеля """
+    await user.send_text('lowprice:command', '/lowprice')
+    await user.send_text('lowprice:city', CITY, expect='search_in_city')
+    if not await user.click('lowprice:select_city', 'search_in_city') or not await user.select_dates('lowprice'):
+        return False
+    if not await user.click('lowprice:first_hotel', 'city_info_correct', expect='get_hotel_photos'):
+        return False
+    for _ in range(hotels - 1):
+        await user.send_text('lowprice:next_hotel', SHOW_MORE)
+    await user.click('lowprice:photos', 'get_hotel_photos', expect='get_photo')
+    await user.send_text('lowprice:main_menu', MAIN_MENU)
+    return True
+
+
+async def run_bestdeal(user: SimulatedUser, hotels: int, min_stars: int) -> bool:
+    """ /bestdeal: город, цена, расстояние, звезды, даты и отели """
+    await user.send_text('bestdeal:command', '/bestdeal')
+    await user.send_text('bestdeal:city', CITY, expect='search_in_city')
+    if not await user.click('bestdeal:select_city', 'search_in_city', expect='select_max_price'):
+        return False
+    await user.click('bestdeal:price', 'select_max_price')
+    await user.send_text('bestdeal:price', '300', expect='end_price_range')
+    await user.click('bestdeal:price', 'end_price_range', expect='select_max_distance')
+    await user.click('bestdeal:distance', 'select_max_distance')
+    await user.send_text('bestdeal:distance', '10', expect='end_distance_range')
+    await user.click('bestdeal:distance', 'end_distance_range', expect='min_stars')
+    if not await user.click('bestdeal:stars', f'min_stars{min_stars}') or not await user.select_dates('bestdeal'):
+        return False
+    if not await user.click('bestdeal:first_hotel', 'city_info_correct', expect='get_hotel_photos'):
+        return False
+    for _ in range(hotels - 1):
+        await user.send_text('bestdeal:next_hotel', SHOW_MORE)
+    await user.send_text('bestdeal:main_menu', MAIN_MENU)
+    return True
+
+
+async def run_history(user: SimulatedUser) -> bool:
+    """ /history: страницы истории и найденные отели последнего поиска """
+    await user.send_text('history:command', '/history')
+    if user.bot_api.last_message_with_button(user.user_id, 'show_history_page') is None:
+        return False
+    await user.click('history:hotels', 'show_history_page', choose=lambda buttons: buttons[-1])
+    await user.send_text('history:main_menu', MAIN_MENU)
+    return True
@@ -0,0 +1,34 @@
+import asyncio
+import sys
+
+from aiohttp import ClientSession
+
+from benchmarks.fixtures import FIXTURES_DIR
+from tgbot.config import load_config
+from tgbot.misc.rapidapi_keys import RapidApiKey, get_headers_by_rapidapi_key
+
+PROPERTIES_LIST_URL = 'https://hotels4.p.rapidapi.com/properties/list'
+
+
+async def record_fixtures(destination_id: str, pages: int):
+    """
+    Записывает настоящие ответы properties/list в benchmarks/fixtures без изменений.
+    Использует первый ключ rapidapi из .env
+    """
+    config = load_config('.env')
+    headers = get_headers_by_rapidapi_key(RapidApiKey(config.rapidapi.keys[0]))
+    FIXTURES_DIR.mkdir(exist_ok=True)
+    async with ClientSession() as session:
+        for page in range(1, pages + 1):
+            querystring = {'destinationId': destination_id, 'pageNumber': str(page), 'pageSize': '25',
+                           'checkIn': '2022-12-01', 'checkOut': '2022-12-05', 'adults1': '1',
+                           'sortOrder': 'DISTANCE_FROM_LANDMARK', 'locale': 'en_US', 'currency': 'USD',
+                           'landmarkIds': 'City center'}
+            async with session.get(PROPERTIES_LIST_URL, params=querystring, headers=headers) as response:
+                response.raise_for_status()
+                fixture = FIXTURES_DIR / f'properties_list_{destination_id}_{page}.json'
+                fixture.write_bytes(await response.read())
+
+
+if __name__ == '__main__':
+    asyncio.run(record_fixtures(destination_id=sys.argv[1], pages=int(sys.argv[2]) if len(sys.argv) > 2 else 3))
@@ -1,11 +1,21 @@
 import logging
+from dataclasses import replace
+from multiprocessing import Process
+from typing import Callable
 
-from aiogram import Bot, Dispatcher
+from aiogram import Dispatcher
+from aiogram.bot.api import TelegramAPIServer, TELEGRAM_PRODUCTION
 from aiogram.contrib.fsm_storage.memory import MemoryStorage
 from aiogram.contrib.middlewares.logging import LoggingMiddleware
+from aiogram.dispatcher.storage import BaseStorage
 from aiogram.utils import executor
+from aiohttp import web
 
 from tgbot.config import load_config
+from tgbot.database.history import ensure_history_indexes
+from tgbot.database.photo_ids import ensure_photo_ids_indexes, photo_ids_write_queue
+from tgbot.database.redis_client import setup_redis, close_redis
+from tgbot.database.write_behind import history_write_queue
 from tgbot.filters.admin_filter import AdminFilter
 from tgbot.handlers.admin import register_admin
 from tgbot.handlers.echo import register_echo
@@ -14,13 +24,34 @@ from tgbot.handlers.get_hotels import register_hotels
 from tgbot.handlers.get_next_hotels import register_next_hotels
 from tgbot.handlers.help import register_help
 from tgbot.handlers.user import register_user
+from tgbot.middlewares.prefetch import PrefetchCancelMiddleware
+from tgbot.misc.delivery import DeliveryScheduler, ThrottledBot
 from tgbot.misc.notify_admins import set_startup_notify
+from tgbot.misc.prefetch import hotels_prefetcher
 from tgbot.misc.setting_commands import set_default_commands
+from tgbot.misc.webhook import create_web_app, set_bot_webhook
+from tgbot.rapidapi.bestdeal import bestdeal_searches
+from tgbot.rapidapi.lazy_hotels import lazy_hotels_pages
+from tgbot.rapidapi.client import setup_rapidapi_client, close_rapidapi_client
+from tgbot.sharding.front import ForwardingDispatcher, UpdateRouter
+from tgbot.sharding.worker import UpdatesWorker
 
 logger = logging.getLogger(__name__)
 config = load_config(".env")
-bot = Bot(token=config.tg_bot.token, parse_mode='HTML')
-storage = MemoryStorage()
+api_server = TelegramAPIServer.from_base(config.tg_bot.api_server) if config.tg_bot.api_server else TELEGRAM_PRODUCTION
+bot = ThrottledBot(token=config.tg_bot.token, parse_mode='HTML', scheduler=DeliveryScheduler(config.delivery),
+                   server=api_server)
+
+
+def create_storage() -> BaseStorage:
+    """ Создает хранилище состояний. aioredis импортируется, только если бот использует Redis """
+    if config.tg_bot.use_redis:
+        from tgbot.misc.redis_storage import create_redis_storage
+        return create_redis_storage(config.redis)
+    return MemoryStorage()
+
+
+storage = create_storage()
 dp = Dispatcher(bot, storage=storage)
 bot['config'] = config
 
@@ -40,29 +71,130 @@ def register_all_handlers(dsp):
     register_echo(dsp)
 
 
-async def main(dispatcher):
+async def setup_bot(dispatcher: Dispatcher):
+    """ Регистрирует обработчики, открывает подключения и запускает фоновые задачи """
     dispatcher.setup_middleware(LoggingMiddleware())
-    logger.info("Starting bot")
-    logging.basicConfig(
-        level=logging.INFO,
-        format=u'%(filename)s:%(lineno)d #%(levelname)-8s [%(asctime)s] - %(name)s - %(message)s',
-    )
+    dispatcher.setup_middleware(PrefetchCancelMiddleware(hotels_prefetcher, bestdeal_searches, lazy_hotels_pages))
 
-    register_all_filters(dp)
-    register_all_handlers(dp)
+    register_all_filters(dispatcher)
+    register_all_handlers(dispatcher)
 
-    await set_startup_notify(bot)
-    await set_default_commands(bot)
+    await setup_rapidapi_client(config.rapidapi)
+    await ensure_history_indexes()
+    await ensure_photo_ids_indexes()
+    history_write_queue.start()
+    photo_ids_write_queue.start()
+    if config.tg_bot.use_redis:
+        await setup_redis(config.redis)
 
-    # start
-    try:
-        await dp.start_polling()
 
-    finally:
+async def connect_to_telegram(dispatcher: Dispatcher):
+    """ Настраивает получение обновлений, команды бота и уведомляет администраторов о запуске """
+    if config.webhook.enabled:
+        await set_bot_webhook(dispatcher.bot, config.webhook)
+    else:
+        await dispatcher.reset_webhook(check=True)
+    await set_startup_notify(dispatcher.bot)
+    await set_default_commands(dispatcher.bot)
+
+
+async def on_startup(dispatcher: Dispatcher):
+    logger.info("Starting bot")
+    await setup_bot(dispatcher)
+    await connect_to_telegram(dispatcher)
+
+
+async def on_shutdown(dispatcher: Dispatcher):
+    """ Останавливает фоновые задачи и закрывает подключения. Хранилище и сессию бота закрывает executor """
+    logger.info("Stopping bot")
+    hotels_prefetcher.cancel_all()
+    bestdeal_searches.cancel_all()
+    lazy_hotels_pages.cancel_all()
+    await history_write_queue.close()
+    await photo_ids_write_queue.close()
+    await close_rapidapi_client()
+    await close_redis()
+    await dispatcher.bot.scheduler.close()
+
+
+def start_receiving_updates(dispatcher: Dispatcher, startup: Callable, shutdown: Callable):
+    """ Получает обновления через webhook или long polling в зависимости от настроек """
+    if config.webhook.enabled:
+        bot_executor = executor.set_webhook(dispatcher, webhook_path=config.webhook.path,
+                                            on_startup=startup, on_shutdown=shutdown,
+                                            web_app=create_web_app(config.webhook))
+        bot_executor.run_app(host=config.webhook.host, port=config.webhook.port)
+    else:
+        executor.start_polling(dispatcher, on_startup=startup, on_shutdown=shutdown)
+
+
+def run_worker(worker_id: int):
+    """ Запускает процесс-обработчик, который получает обновления своих чатов от основного процесса """
+    workers_amount = config.sharding.workers
+    bot.scheduler = DeliveryScheduler(replace(config.delivery,
+                                              global_rate=config.delivery.global_rate / workers_amount,
+                                              global_burst=max(config.delivery.global_burst / workers_amount, 1)))
+    worker = UpdatesWorker(dispatcher=dp, worker_id=worker_id)
+
+    async def on_worker_startup(_):
+        logger.info("Starting worker %s", worker_id)
+        await setup_bot(dp)
+
+    async def on_worker_shutdown(_):
+        await worker.close()
+        await on_shutdown(dp)
         await dp.storage.close()
         await dp.storage.wait_closed()
         await bot.session.close()
 
+    app = worker.create_app()
+    app.on_startup.append(on_worker_startup)
+    app.on_shutdown.append(on_worker_shutdown)
+    web.run_app(app, host=config.sharding.host, port=config.sharding.base_port + worker_id, print=None)
+
+
+def run_sharded_bot():
+    """
+    Запускает WORKERS процессов-обработчиков и основной процесс, который получает обновления от Telegram
+    и распределяет их по процессам по id чата
+    """
+    if not config.tg_bot.use_redis:
+        logger.warning("USE_REDIS=False: user states are kept in worker memory and are lost if a chat moves "
+                       "to another worker")
+    workers = [Process(target=run_worker, args=(worker_id,), name=f'worker-{worker_id}')
+               for worker_id in range(config.sharding.workers)]
+    for worker in workers:
+        worker.start()
+    router = UpdateRouter(config.sharding)
+
+    async def on_front_startup(dispatcher: Dispatcher):
+        logger.info("Starting bot with %s workers", len(workers))
+        await router.wait_for_workers()
+        await connect_to_telegram(dispatcher)
+
+    async def on_front_shutdown(dispatcher: Dispatcher):
+        await router.close()
+        await dispatcher.bot.scheduler.close()
+
+    try:
+        start_receiving_updates(ForwardingDispatcher(bot, router=router), on_front_startup, on_front_shutdown)
+    finally:
+        for worker in workers:
+            worker.terminate()
+        for worker in workers:
+            worker.join()
+
+
+def run_bot():
+    logging.basicConfig(
+        level=logging.INFO,
+        format=u'%(filename)s:%(lineno)d #%(levelname)-8s [%(asctime)s] - %(name)s - %(message)s',
+    )
+    if config.sharding.workers > 1:
+        run_sharded_bot()
+    else:
+        start_receiving_updates(dp, on_startup, on_shutdown)
+
 
 if __name__ == '__main__':
-    executor.start_polling(dp, on_startup=main)
+    run_bot()
@@ -9,6 +9,40 @@ class DbConfig:
     password: str
     user: str
     database: str
+    uri: str
+
+
+@dataclass
+class ShardingConfig:
+    workers: int
+    host: str
+    base_port: int
+    virtual_nodes: int
+    retry_after: float
+
+    def worker_urls(self) -> list[str]:
+        """ Возвращает адреса HTTP-серверов всех процессов-обработчиков """
+        return [f'http://{self.host}:{self.base_port + index}' for index in range(self.workers)]
+
+
+@dataclass
+class DeliveryConfig:
+    global_rate: float
+    global_burst: float
+    chat_rate: float
+    chat_burst: float
+    max_retries: int
+    cleanup_concurrency: int
+
+
+@dataclass
+class RedisConfig:
+    host: str
+    port: int
+    db: int
+    password: str
+    state_ttl: int
+    data_ttl: int
 
 
 @dataclass
@@ -16,6 +50,72 @@ class TgBot:
     token: str
     admin_ids: list[int]
     use_redis: bool
+    api_server: str
+
+
+@dataclass
+class WebhookConfig:
+    enabled: bool
+    url: str
+    path: str
+    secret: str
+    host: str
+    port: int
+
+
+@dataclass
+class RapidApiConfig:
+    base_url: str
+    keys: list[str]
+    key_cooldown: float
+    timeout: float
+    connect_timeout: float
+    connections_limit: int
+    connections_per_host: int
+    dns_cache_ttl: int
+    keepalive_timeout: float
+    selective_parsing: bool
+
+
+@dataclass
+class CacheConfig:
+    cities_maxsize: int
+    cities_ttl: float
+    cities_negative_ttl: float
+    hotels_page_ttl: float
+    hotels_registry_maxsize: int
+    photo_ids_maxsize: int
+    bad_photo_ttl: float
+
+
+@dataclass
+class SearchConfig:
+    prefetch_threshold: float
+    lazy_parsing: bool
+    lazy_pages_maxsize: int
+    lazy_pages_ttl: float
+    bestdeal_fanout: int
+    bestdeal_searches_maxsize: int
+    bestdeal_searches_ttl: float
+    ranking_pages: int
+    ranking_top_k: int
+    ranking_price_weight: float
+    ranking_distance_weight: float
+    ranking_stars_weight: float
+
+
+@dataclass
+class HistoryConfig:
+    page_size: int
+    max_searches: int
+    max_hotels: int
+    ttl_days: int
+    cache_max_users: int
+    cache_max_bytes: int
+    cache_ttl: float
+    write_batch_size: int
+    write_flush_interval: float
+    hotels_as_albums: bool
 
 
 @dataclass
@@ -26,7 +126,15 @@ class Miscellaneous:
 @dataclass
 class Config:
     tg_bot: TgBot
+    webhook: WebhookConfig
+    sharding: ShardingConfig
+    delivery: DeliveryConfig
     db: DbConfig
+    redis: RedisConfig
+    rapidapi: RapidApiConfig
+    cache: CacheConfig
+    search: SearchConfig
+    history: HistoryConfig
     misc: Miscellaneous
 
 
@@ -39,12 +147,100 @@ def load_config(path: str = None):
             token=env.str("BOT_TOKEN"),
             admin_ids=list(map(int, env.list("ADMINS"))),
             use_redis=env.bool("USE_REDIS"),
+            api_server=env.str('BOT_API_SERVER', None),
+        ),
+        webhook=WebhookConfig(
+            enabled=env.bool('USE_WEBHOOK', False),
+            url=env.str('WEBHOOK_URL', None),
+            path=env.str('WEBHOOK_PATH', '/webhook'),
+            secret=env.str('WEBHOOK_SECRET', None),
+            host=env.str('WEBAPP_HOST', '0.0.0.0'),
+            port=env.int('WEBAPP_PORT', 8080),
+        ),
+        sharding=ShardingConfig(
+            workers=env.int('WORKERS', 1),
+            host=env.str('WORKERS_HOST', '127.0.0.1'),
+            base_port=env.int('WORKERS_BASE_PORT', 8100),
+            virtual_nodes=env.int('WORKERS_VIRTUAL_NODES', 100),
+            retry_after=env.float('WORKERS_RETRY_AFTER', 5),
+        ),
+        delivery=DeliveryConfig(
+            global_rate=env.float('DELIVERY_GLOBAL_RATE', 30),
+            global_burst=env.float('DELIVERY_GLOBAL_BURST', 30),
+            chat_rate=env.float('DELIVERY_CHAT_RATE', 1),
+            chat_burst=env.float('DELIVERY_CHAT_BURST', 3),
+            max_retries=env.int('DELIVERY_MAX_RETRIES', 3),
+            cleanup_concurrency=env.int('CLEANUP_CONCURRENCY', 10),
         ),
         db=DbConfig(
             host=env.str('DB_HOST'),
             password=env.str('DB_PASS'),
             user=env.str('DB_USER'),
-            database=env.str('DB_NAME')
+            database=env.str('DB_NAME'),
+            uri=env.str('DB_URI', None),
+        ),
+        redis=RedisConfig(
+            host=env.str('REDIS_HOST', 'localhost'),
+            port=env.int('REDIS_PORT', 6379),
+            db=env.int('REDIS_DB', 0),
+            password=env.str('REDIS_PASSWORD', None),
+            state_ttl=env.int('FSM_STATE_TTL', 7 * 24 * 60 * 60),
+            data_ttl=env.int('FSM_DATA_TTL', 24 * 60 * 60),
+        ),
+        rapidapi=RapidApiConfig(
+            base_url=env.str('RAPIDAPI_BASE_URL', 'https://hotels4.p.rapidapi.com').rstrip('/'),
+            keys=load_rapidapi_keys(env),
+            key_cooldown=env.float('RAPIDAPI_KEY_COOLDOWN', 60),
+            timeout=env.float('RAPIDAPI_TIMEOUT', 10),
+            connect_timeout=env.float('RAPIDAPI_CONNECT_TIMEOUT', 3),
+            connections_limit=env.int('RAPIDAPI_CONNECTIONS_LIMIT', 100),
+            connections_per_host=env.int('RAPIDAPI_CONNECTIONS_PER_HOST', 30),
+            dns_cache_ttl=env.int('RAPIDAPI_DNS_CACHE_TTL', 300),
+            keepalive_timeout=env.float('RAPIDAPI_KEEPALIVE_TIMEOUT', 60),
+            selective_parsing=env.bool('RAPIDAPI_SELECTIVE_PARSING', False),
+        ),
+        cache=CacheConfig(
+            cities_maxsize=env.int('CITIES_CACHE_MAXSIZE', 1000),
+            cities_ttl=env.float('CITIES_CACHE_TTL', 24 * 60 * 60),
+            cities_negative_ttl=env.float('CITIES_CACHE_NEGATIVE_TTL', 10 * 60),
+            hotels_page_ttl=env.float('HOTELS_PAGE_CACHE_TTL', 5 * 60),
+            hotels_registry_maxsize=env.int('HOTELS_REGISTRY_MAXSIZE', 50000),
+            photo_ids_maxsize=env.int('PHOTO_IDS_CACHE_MAXSIZE', 20000),
+            bad_photo_ttl=env.float('BAD_PHOTO_TTL', 24 * 60 * 60),
+        ),
+        search=SearchConfig(
+            prefetch_threshold=env.float('PREFETCH_THRESHOLD', 0.6),
+            lazy_parsing=env.bool('LAZY_HOTELS_PARSING', True),
+            lazy_pages_maxsize=env.int('LAZY_PAGES_MAXSIZE', 10000),
+            lazy_pages_ttl=env.float('LAZY_PAGES_TTL', 30 * 60),
+            bestdeal_fanout=env.int('BESTDEAL_FANOUT', 3),
+            bestdeal_searches_maxsize=env.int('BESTDEAL_SEARCHES_MAXSIZE', 1000),
+            bestdeal_searches_ttl=env.float('BESTDEAL_SEARCHES_TTL', 30 * 60),
+            ranking_pages=env.int('RANKING_PAGES', 8),
+            ranking_top_k=env.int('RANKING_TOP_K', 10),
+            ranking_price_weight=env.float('RANKING_PRICE_WEIGHT', 1),
+            ranking_distance_weight=env.float('RANKING_DISTANCE_WEIGHT', 0.5),
+            ranking_stars_weight=env.float('RANKING_STARS_WEIGHT', 0.5),
+        ),
+        history=HistoryConfig(
+            page_size=env.int('HISTORY_PAGE_SIZE', 5),
+            max_searches=env.int('HISTORY_MAX_SEARCHES', 50),
+            max_hotels=env.int('HISTORY_MAX_HOTELS', 50),
+            ttl_days=env.int('HISTORY_TTL_DAYS', 90),
+            cache_max_users=env.int('HISTORY_CACHE_MAX_USERS', 1000),
+            cache_max_bytes=env.int('HISTORY_CACHE_MAX_BYTES', 64 * 1024 * 1024),
+            cache_ttl=env.float('HISTORY_CACHE_TTL', 10 * 60),
+            write_batch_size=env.int('HISTORY_WRITE_BATCH_SIZE', 100),
+            write_flush_interval=env.float('HISTORY_WRITE_FLUSH_INTERVAL', 1),
+            hotels_as_albums=env.bool('HISTORY_HOTELS_AS_ALBUMS', True),
         ),
         misc=Miscellaneous()
     )
+
+
+def load_rapidapi_keys(env: Env) -> list[str]:
+    """ Загружает список ключей rapidapi. Поддерживает старые переменные с одним или двумя ключами """
+    keys = env.list('RAPID_API_KEYS', [])
+    if not keys:
+        keys = [env.str('RAPID_API_KEY', ''), env.str('ANOTHER_RAPID_API_KEY', '')]
+    return [key for key in keys if key]
@@ -1,75 +1,101 @@
-from aiogram import types
+import bisect
+from datetime import datetime
+
 from aiogram.types import Message
-from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import ASCENDING, DESCENDING, InsertOne, UpdateOne
 
-from tgbot.database.client import get_history_collection
+from tgbot.config import load_config
+from tgbot.database.client import get_searches_collection
+from tgbot.database.history_cache import history_cache, CachedHistory
+from tgbot.database.retention import ensure_expiry_index, trim_user_history
+from tgbot.database.write_behind import history_write_queue
 from tgbot.keyboards.inline import inline_markup_from_dict
 from tgbot.misc.dates import get_readable_date_time
-from tgbot.misc.named_tuples import HistoryPage, HotelMessage
+from tgbot.misc.cleanup import delete_messages
+from tgbot.misc.message_refs import message_ref
+from tgbot.misc.named_tuples import HistoryPage, HistorySlice, HotelMessage, MessageRef
+
+config = load_config(".env")
+
+# История хранится по одному документу на каждый вызов команды поиска:
+# {'user_id', 'call_time', 'created_at', 'command', 'city', 'text', 'found_hotels'}
+
+
+async def ensure_history_indexes():
+    """ Создает индексы коллекции истории. Вызывается при запуске бота """
+    collection = get_searches_collection()
+    await collection.create_index([('user_id', ASCENDING), ('call_time', ASCENDING)], unique=True)
+    await ensure_expiry_index()
+
+
+def search_filter(user_id: int, call_time: str) -> dict:
+    """ Возвращает фильтр документа истории по пользователю и времени вызова команды """
+    return {'user_id': user_id, 'call_time': call_time}
 
 
 async def add_hotel_to_history(message: Message, call_time):
     """
     Добавляет отель в историю пользователей в базе данных.
-    Добавляет на страницу истории по времени вызова команды
+    Добавляет на страницу истории по времени вызова команды. Запись в БД выполняется в фоне
     """
-    collection = get_history_collection()
-    user = await collection.find_one({'_id': message.chat.id})
-    if user:
-        history = user['history']
-    else:
-        history = dict()
-        history[str(call_time)]['found_hotels'] = list()
-    current_history_page: list = history[str(call_time)]['found_hotels']
-    current_history_page.append(hotel_dict_from_message(message))
-    await collection.update_one({'_id': message.chat.id}, {'$set': {'history': history}})
-
-
-async def add_command_to_history(command: str, call_time, message: Message):
-    """ Добавляет вызванную команду в базу данных по времени, когда была вызвана команда """
-    collection = get_history_collection()
-    user = await collection.find_one({'_id': message.chat.id})
-    if user:
-        await add_new_to_history(user, collection, command, str(call_time), message)
-    else:
-        await create_history(collection, command, str(call_time), message)
+    user_id, call_time, max_hotels = message.chat.id, str(call_time), config.history.max_hotels
+    hotel = hotel_dict_from_message(message)
+    history_write_queue.put(UpdateOne(search_filter(user_id, call_time),
+                                      {'$push': {'found_hotels': {'$each': [hotel], '$slice': max_hotels}}}))
+    history_cache.update(user_id, lambda history: history.add_hotel(call_time, hotel, max_hotels=max_hotels))
 
 
-async def add_new_to_history(user: dict, collection: AsyncIOMotorCollection, command: str, call_time: str,
-                             message: Message):
-    """ Добавляет команду в историю, если пользователь существует в БД """
-    user_history = user['history']
-    user_history_page = create_history_dict(command=command, call_time=call_time)
-    user_history[call_time] = user_history_page
-    await collection.update_one({'_id': message.chat.id}, {'$set': {'history': user_history}})
+async def add_command_to_history(command: str, call_time: datetime, message: Message):
+    """
+    Добавляет вызванную команду в базу данных по времени, когда была вызвана команда. Запись выполняется в фоне.
+    В той же транзакции удаляются самые старые поиски пользователя сверх лимита
+    """
+    user_id = message.chat.id
+    search = create_search_document(user_id=user_id, command=command, call_time=call_time)
+    cached_search = {'call_time': search['call_time'], 'text': search['text'], 'city': None,
+                     'hotels_amount': 0, 'found_hotels': []}
+    history_write_queue.put(InsertOne(search),
+                            after_write=lambda session: trim_user_history(user_id=user_id, session=session))
+    history_cache.update(user_id, lambda history: add_search_to_cache(history, cached_search))
+
+
+def add_search_to_cache(history: CachedHistory, search: dict):
+    """ Добавляет новый поиск в кэш истории пользователя с учетом лимита поисков """
+    history.add_search(search)
+    history.trim(max_searches=config.history.max_searches)
+
+
+def create_search_document(user_id: int, command: str, call_time: datetime) -> dict:
+    """ Создает документ истории по команде и времени, когда команда была вызвана """
+    return {
+        'user_id': user_id,
+        'call_time': str(call_time),
+        'created_at': call_time,
+        'command': command,
+        'city': None,
+        'text': create_history_text(command=command, call_time=str(call_time)),
+        'found_hotels': []
+    }
 
 
-async def create_history(collection: AsyncIOMotorCollection, command: str, call_time: str, message: Message):
-    """ Создает запись истории пользователей в базе данных. Добавляет команду в историю пользователей в БД """
-    user_history_page = create_history_dict(command=command, call_time=call_time)
-    await collection.insert_one({'_id': message.chat.id, 'history': {call_time: user_history_page}})
+def create_history_text(command: str, call_time: str) -> str:
+    """ Создает текст страницы истории по команде и времени, когда команда была вызвана """
+    return f'<b>Команда</b> /{command} вызвана\n' \
+           f'в {get_readable_date_time(call_time)}'
 
 
-def create_history_dict(command: str, call_time: str) -> dict:
-    """ Создает запись истории по команде и времени, когда команда была вызвана """
-    history_dict = {
-        'text': f'<b>Команда</b> /{command} вызвана\n'
-                f'в {get_readable_date_time(call_time)}',
-        'found_hotels': []
-    }
-    return history_dict
+def get_history_page_text(search: dict) -> str:
+    """ Возвращает текст страницы истории с названием выбранного города """
+    city = search.get('city')
+    if city is None:
+        return search.get('text')
+    return f'Поиск в городе <b>{city}</b>\n' + search.get('text')
 
 
-async def add_city_to_history(city: str, call_time: str, user_id: str):
-    """ Добавляет название выбранного города в текст на странице истории """
-    collection = get_history_collection()
-    user = await collection.find_one({'_id': user_id})
-    user_history: dict = user['history']
-    history_page: dict = user_history[call_time]
-    text_to_edit = history_page.get('text')
-    text_with_city = f'Поиск в городе <b>{city}</b>\n' + text_to_edit
-    history_page['text'] = text_with_city
-    await collection.update_one({'_id': user_id}, {'$set': {'history': user_history}})
+async def add_city_to_history(city: str, call_time: str, user_id: int):
+    """ Добавляет название выбранного города на страницу истории. Запись в БД выполняется в фоне """
+    history_write_queue.put(UpdateOne(search_filter(user_id, call_time), {'$set': {'city': city}}))
+    history_cache.update(user_id, lambda history: history.update_search(call_time, city=city))
 
 
 def is_message_contains_photo(message: Message) -> bool:
@@ -101,78 +127,146 @@ def hotel_message_from_hotel_dict(hotel_info: dict) -> HotelMessage:
     )
 
 
-async def get_my_history(message: types.Message) -> list[HistoryPage]:
+async def get_my_history(user_id: int, limit: int, older_than: str = None, newer_than: str = None) -> HistorySlice:
     """
-    Возвращает список всех страниц истории пользователей в БД
-    по идентификатору пользователя (получает из сообщения)
+    Возвращает часть страниц истории пользователя размером limit.
+    Без курсора возвращает самые новые страницы, с курсором - страницы раньше older_than или позже newer_than.
+    Страницы упорядочены от старых к новым
     """
-    user_history: dict = await find_history_in_db(user_id=message.chat.id)
-    history_pages: list[HistoryPage] = parse_user_history(history=user_history)
-    return history_pages
+    history = await load_user_history(user_id=user_id)
+    call_times = history.call_times
+    if older_than is not None:
+        end = bisect.bisect_left(call_times, older_than)
+        start = max(end - limit, 0)
+    elif newer_than is not None:
+        start = bisect.bisect_right(call_times, newer_than)
+        end = min(start + limit, len(call_times))
+    else:
+        end = len(call_times)
+        start = max(end - limit, 0)
+    user_history = [history.searches[call_time] for call_time in call_times[start:end]]
+    return HistorySlice(pages=parse_user_history(history=user_history),
+                        has_older=start > 0, has_newer=end < len(call_times))
+
+
+async def load_user_history(user_id: int) -> CachedHistory:
+    """ Возвращает историю пользователя из кэша, а если ее там нет - загружает из БД и сохраняет в кэш """
+    history = history_cache.get(user_id)
+    if history is None:
+        history = history_cache.put(user_id, await find_history_in_db(user_id=user_id))
+    return history
 
 
 async def get_found_hotels_of_command(user_id: int, call_time: str) -> list[HotelMessage]:
     """ Возвращает список найденных отелей по вызванной команде """
-    collection = get_history_collection()
-    user: dict = await collection.find_one({'_id': user_id})
-    history = user['history']
-    found_hotels: list[dict] = history[call_time]['found_hotels']
+    history = await load_user_history(user_id=user_id)
+    search = history.searches.get(call_time)
+    if search is None:
+        return []
+    found_hotels: list[dict] = search.get('found_hotels')
+    if found_hotels is None:
+        found_hotels = await find_found_hotels_in_db(user_id=user_id, call_time=call_time)
+        history_cache.update(user_id, lambda cached: cached.update_search(call_time, found_hotels=found_hotels))
     found_hotels_messages: list[HotelMessage] = list(map(hotel_message_from_hotel_dict, found_hotels))
     return found_hotels_messages
 
 
-async def find_history_in_db(user_id: int) -> dict:
-    """ Находит историю пользователей в базе данных """
-    collection = get_history_collection()
-    user: dict = await collection.find_one({'_id': user_id})
-    if user:
-        return user['history']
-    return {}
+async def find_found_hotels_in_db(user_id: int, call_time: str) -> list[dict]:
+    """ Находит в базе данных отели, найденные вызванной командой """
+    await history_write_queue.flush()
+    collection = get_searches_collection()
+    search: dict = await collection.find_one(search_filter(user_id, call_time), {'found_hotels': 1})
+    return search['found_hotels'] if search else []
 
 
-def parse_user_history(history: dict) -> list[HistoryPage]:
+async def find_history_in_db(user_id: int) -> list[dict]:
+    """
+    Находит историю пользователя в базе данных одним запросом.
+    Загружает не больше HISTORY_MAX_SEARCHES самых новых поисков, упорядоченных от старых к новым.
+    Вместо списков найденных отелей возвращает только их количество
+    """
+    await history_write_queue.flush()
+    collection = get_searches_collection()
+    max_searches = config.history.max_searches
+    pipeline = [
+        {'$match': {'user_id': user_id}},
+        {'$sort': {'call_time': DESCENDING}},
+        {'$limit': max_searches},
+        {'$project': {'_id': 0, 'call_time': 1, 'text': 1, 'city': 1,
+                      'hotels_amount': {'$size': {'$ifNull': ['$found_hotels', []]}}}},
+    ]
+    history = await collection.aggregate(pipeline).to_list(length=max_searches)
+    history.reverse()
+    return history
+
+
+async def clear_history(user_id: int):
+    """ Очистить всю историю пользователей в БД """
+    history_cache.invalidate(user_id)
+    await history_write_queue.flush()
+    collection = get_searches_collection()
+    await collection.delete_many({'user_id': user_id})
+
+
+def parse_user_history(history: list[dict]) -> list[HistoryPage]:
     """ Возвращает список страниц истории пользователей по найденной истории """
-    history_pages = list()
-    for call_time, history_part in history.items():
-        found_hotels = [hotel_message_from_hotel_dict(hotel_info) for hotel_info in history_part.get('found_hotels')]
-        history_pages.append(HistoryPage(command_call_time=call_time,
-                                         text=history_part.get('text'),
-                                         found_hotels=found_hotels))
-    return history_pages
+    return [HistoryPage(command_call_time=search.get('call_time'),
+                        text=get_history_page_text(search),
+                        has_hotels=search.get('hotels_amount') > 0)
+            for search in history]
 
 
 class SandedHistory:
-    """ Класс, который работает с отправленными сообщениями в историю """
-    def __init__(self, history_caption: Message):
-        self.history_caption: Message = history_caption
-        self.command_messages: list[Message] = list()
-        self.found_hotels: dict[str, list[Message]] = dict()
+    """ Класс, который работает с отправленными сообщениями в историю. Хранит только ссылки на сообщения """
+    def __init__(self, history_caption: MessageRef):
+        self.history_caption: MessageRef = history_caption
+        self.command_messages: list[MessageRef] = list()
+        self.found_hotels: dict[str, list[MessageRef]] = dict()
 
     def add_new_command_message(self, message: Message):
         """ Добавляет новое сообщение с информацией о команде для отправки """
-        self.command_messages.append(message)
+        self.command_messages.append(message_ref(message))
 
-    def add_new_found_hotel(self, command_cal_time: str, hotel: Message):
-        """ Добавляет сообщение об отеле на выбранную страницу истории """
-        found_hotels_of_command = self.found_hotels.get(command_cal_time)
-        if found_hotels_of_command is None:
-            self.found_hotels[command_cal_time] = list()
-            self.found_hotels[command_cal_time].append(hotel)
-            return
-        self.found_hotels[command_cal_time].append(hotel)
+    def add_new_found_hotels(self, command_cal_time: str, hotels: list[Message]):
+        """ Добавляет сообщения с отелями (в том числе все сообщения альбомов) на выбранную страницу истории """
+        self.found_hotels.setdefault(command_cal_time, list()).extend(map(message_ref, hotels))
 
     async def hide_found_hotels(self, command_cal_time: str):
         """ Удаляет сообщения отеля с выбранной страницы истории """
-        found_hotels: list[Message] = self.found_hotels[command_cal_time]
-        for hotel in found_hotels:
-            await hotel.delete()
+        found_hotels: list[MessageRef] = self.found_hotels.get(command_cal_time, list())
+        await delete_messages(found_hotels)
         self.found_hotels[command_cal_time] = list()
 
+    async def delete_screen_messages(self):
+        """ Удаляет сообщения текущего экрана истории: страницы и их отели. Заголовок истории остается """
+        await delete_messages(self.screen_messages())
+        self.found_hotels = dict()
+        self.command_messages = list()
+
     async def delete_all_history_messages(self):
         """ Удаляет все сообщения истории """
-        for history_page in self.found_hotels.values():
-            for hotel in history_page:
-                await hotel.delete()
-        for command_message in self.command_messages:
-            await command_message.delete()
-        await self.history_caption.delete()
+        await delete_messages([*self.screen_messages(), self.history_caption])
+        self.found_hotels = dict()
+        self.command_messages = list()
+
+    def screen_messages(self) -> list[MessageRef]:
+        """ Возвращает ссылки на все сообщения текущего экрана истории """
+        hotels = [hotel for history_page in self.found_hotels.values() for hotel in history_page]
+        return hotels + self.command_messages
+
+    def to_dict(self) -> dict:
+        """ Преобразует отправленную историю в dict для хранения в состоянии пользователя """
+        return {
+            'caption': list(self.history_caption),
+            'commands': [list(ref) for ref in self.command_messages],
+            'hotels': {call_time: [list(ref) for ref in refs] for call_time, refs in self.found_hotels.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, sanded_history: dict) -> 'SandedHistory':
+        """ Восстанавливает отправленную историю из dict, сохраненного в состоянии пользователя """
+        history = cls(history_caption=MessageRef(*sanded_history['caption']))
+        history.command_messages = [MessageRef(*ref) for ref in sanded_history['commands']]
+        history.found_hotels = {call_time: [MessageRef(*ref) for ref in refs]
+                                for call_time, refs in sanded_history['hotels'].items()}
+        return history
@@ -0,0 +1,131 @@
+import bisect
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from tgbot.config import load_config
+
+SEARCH_OVERHEAD_BYTES = 200
+HOTEL_OVERHEAD_BYTES = 100
+
+
+class CachedHistory:
+    """
+    История одного пользователя в памяти: краткая информация о всех его поисках,
+    упорядоченная по времени вызова команды. Отели поиска загружаются только по запросу
+    """
+    def __init__(self, searches: list[dict]):
+        self.loaded_at: float = time.monotonic()
+        self.call_times: list[str] = [search['call_time'] for search in searches]
+        self.searches: dict[str, dict] = {search['call_time']: search for search in searches}
+        self.size: int = sum(map(estimate_search_size, searches))
+
+    def add_search(self, search: dict):
+        """ Добавляет новый поиск """
+        bisect.insort(self.call_times, search['call_time'])
+        self.searches[search['call_time']] = search
+        self.size += estimate_search_size(search)
+
+    def trim(self, max_searches: int):
+        """ Удаляет самые старые поиски сверх лимита """
+        while len(self.call_times) > max_searches:
+            search = self.searches.pop(self.call_times.pop(0))
+            self.size -= estimate_search_size(search)
+
+    def update_search(self, call_time: str, **fields):
+        """ Изменяет поля поиска """
+        search = self.searches.get(call_time)
+        if search is None:
+            return
+        self.size -= estimate_search_size(search)
+        search.update(fields)
+        self.size += estimate_search_size(search)
+
+    def add_hotel(self, call_time: str, hotel: dict, max_hotels: int):
+        """ Добавляет отель в поиск, если отелей в нем меньше лимита """
+        search = self.searches.get(call_time)
+        if search is None or search['hotels_amount'] >= max_hotels:
+            return
+        search['hotels_amount'] += 1
+        if search.get('found_hotels') is not None:
+            search['found_hotels'].append(hotel)
+            self.size += estimate_hotel_size(hotel)
+
+
+def estimate_hotel_size(hotel: dict) -> int:
+    """ Примерно оценивает размер отеля в памяти в байтах """
+    return HOTEL_OVERHEAD_BYTES + len(hotel.get('text') or '') + len(hotel.get('photo_id') or '')
+
+
+def estimate_search_size(search: dict) -> int:
+    """ Примерно оценивает размер поиска в памяти в байтах """
+    size = SEARCH_OVERHEAD_BYTES + len(search.get('text') or '') + len(search.get('city') or '')
+    return size + sum(map(estimate_hotel_size, search.get('found_hotels') or []))
+
+
+class HistoryCache:
+    """
+    Кэш истории пользователей в памяти со сквозной записью: каждое изменение истории сразу применяется к кэшу.
+    Ограничен количеством пользователей и суммарным размером, давно не использованные пользователи вытесняются
+    """
+    def __init__(self, max_users: int, max_bytes: int, ttl: float):
+        self.max_users: int = max_users
+        self.max_bytes: int = max_bytes
+        self.ttl: float = ttl
+        self.size: int = 0
+        self._users: OrderedDict[int, CachedHistory] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._users)
+
+    def get(self, user_id: int) -> Optional[CachedHistory]:
+        """ Возвращает историю пользователя или None, если ее нет в кэше или она устарела """
+        history = self._users.get(user_id)
+        if history is None:
+            return None
+        if time.monotonic() - history.loaded_at > self.ttl:
+            self.invalidate(user_id)
+            return None
+        self._users.move_to_end(user_id)
+        return history
+
+    def put(self, user_id: int, searches: list[dict]) -> CachedHistory:
+        """ Сохраняет загруженную из БД историю пользователя """
+        self.invalidate(user_id)
+        history = CachedHistory(searches)
+        self._users[user_id] = history
+        self.size += history.size
+        self._evict()
+        return history
+
+    def update(self, user_id: int, change: Callable[[CachedHistory], None]):
+        """ Применяет изменение к истории пользователя, если она есть в кэше """
+        history = self._users.get(user_id)
+        if history is None:
+            return
+        self.size -= history.size
+        change(history)
+        self.size += history.size
+        self._evict()
+
+    def invalidate(self, user_id: int):
+        """ Удаляет историю пользователя из кэша """
+        history = self._users.pop(user_id, None)
+        if history is not None:
+            self.size -= history.size
+
+    def clear(self):
+        """ Очищает кэш """
+        self._users.clear()
+        self.size = 0
+
+    def _evict(self):
+        """ Вытесняет давно не использованных пользователей, пока кэш не уложится в ограничения """
+        while self._users and (len(self._users) > self.max_users or self.size > self.max_bytes):
+            _, history = self._users.popitem(last=False)
+            self.size -= history.size
+
+
+config = load_config(".env")
+history_cache = HistoryCache(max_users=config.history.cache_max_users, max_bytes=config.history.cache_max_bytes,
+                             ttl=config.history.cache_ttl)
@@ -0,0 +1,81 @@
+"""
+Переносит историю из старого формата (один документ на пользователя с dict 'history')
+в новый формат (один документ на каждый вызов команды поиска).
+
+Запуск из папки проекта:
+    python -m tgbot.database.migrate_history [--drop-legacy]
+"""
+import argparse
+import asyncio
+import logging
+import re
+from datetime import datetime
+from typing import Optional
+
+from pymongo import ReplaceOne
+
+from tgbot.database.client import get_history_collection, get_searches_collection
+from tgbot.database.history import ensure_history_indexes
+
+logger = logging.getLogger(__name__)
+
+CITY_PATTERN = re.compile(r'^Поиск в городе <b>(.*?)</b>\n')
+COMMAND_PATTERN = re.compile(r'/(\w+) вызвана')
+
+
+def split_legacy_text(text: str) -> tuple[Optional[str], str]:
+    """ Отделяет название города от текста страницы истории старого формата """
+    city = None
+    match = CITY_PATTERN.match(text)
+    while match:
+        city = city or match.group(1)
+        text = text[match.end():]
+        match = CITY_PATTERN.match(text)
+    return city, text
+
+
+def search_document_from_legacy(user_id: int, call_time: str, history_page: dict) -> dict:
+    """ Создает документ истории нового формата из страницы истории старого формата """
+    city, text = split_legacy_text(history_page.get('text', ''))
+    command = COMMAND_PATTERN.search(text)
+    return {
+        'user_id': user_id,
+        'call_time': call_time,
+        'created_at': datetime.fromisoformat(call_time),
+        'command': command.group(1) if command else None,
+        'city': city,
+        'text': text,
+        'found_hotels': history_page.get('found_hotels', []),
+    }
+
+
+async def migrate_history(drop_legacy: bool = False) -> int:
+    """ Переносит историю всех пользователей. Повторный запуск не создает дубликатов """
+    legacy_collection = get_history_collection()
+    searches_collection = get_searches_collection()
+    await ensure_history_indexes()
+    migrated = 0
+    async for user in legacy_collection.find({'history': {'$exists': True}}):
+        operations = [ReplaceOne({'user_id': user['_id'], 'call_time': call_time},
+                                 search_document_from_legacy(user['_id'], call_time, history_page),
+                                 upsert=True)
+                      for call_time, history_page in user['history'].items()]
+        if operations:
+            await searches_collection.bulk_write(operations, ordered=False)
+        migrated += len(operations)
+        if drop_legacy:
+            await legacy_collection.delete_one({'_id': user['_id']})
+    return migrated
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Migrate search history to one document per search')
+    parser.add_argument('--drop-legacy', action='store_true', help='delete migrated legacy documents')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    migrated = asyncio.run(migrate_history(drop_legacy=args.drop_legacy))
+    logger.info('Migrated %s searches', migrated)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Optional, Union
+
+from aiogram.types import Message
+from aiogram.utils.exceptions import InvalidHTTPUrlContent, WrongFileIdentifier
+from pymongo import ASCENDING, UpdateOne
+from pymongo.errors import PyMongoError
+
+from tgbot.config import load_config
+from tgbot.database.client import get_photo_ids_collection
+from tgbot.database.write_behind import WriteBehindQueue
+from tgbot.misc.named_tuples import Link, PhotoID
+from tgbot.misc.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+config = load_config(".env")
+
+# Документ коллекции: {'_id': ссылка, 'file_id': id фотографии в Telegram}
+# или {'_id': ссылка, 'bad': True, 'expires_at': время}, если Telegram не смог загрузить фотографию по ссылке
+
+BAD_PHOTO = 'bad_photo'
+UNKNOWN_PHOTO = 'unknown_photo'
+UNKNOWN_PHOTO_TTL = 60
+PHOTO_ID_TTL = 24 * 60 * 60
+
+photo_ids_cache = TTLCache(maxsize=config.cache.photo_ids_maxsize, ttl=PHOTO_ID_TTL)
+photo_ids_write_queue = WriteBehindQueue(get_collection=get_photo_ids_collection,
+                                         max_batch=config.history.write_batch_size,
+                                         flush_interval=config.history.write_flush_interval)
+
+
+def is_photo_link(photo: str) -> bool:
+    """ Проверяет, является ли фотография ссылкой, а не id уже загруженной в Telegram фотографии """
+    return isinstance(photo, str) and photo.startswith(('http://', 'https://'))
+
+
+async def ensure_photo_ids_indexes():
+    """ Создает TTL-индекс, по которому MongoDB удаляет устаревшие отметки о недоступных фотографиях """
+    await get_photo_ids_collection().create_index([('expires_at', ASCENDING)], expireAfterSeconds=0)
+
+
+async def resolve_photos(photos: list[Link]) -> list[Optional[PhotoID]]:
+    """
+    Заменяет ссылки на фотографии id уже загруженных в Telegram фотографий.
+    Неизвестные ссылки остаются без изменений, вместо недоступных фотографий возвращается None.
+    Ссылки, которых нет в памяти, ищутся в базе данных одним запросом. Каждая ссылка ищется в кэше один раз
+    """
+    cached_photos = {photo: photo_ids_cache.get(photo) for photo in set(photos) if is_photo_link(photo)}
+    unknown_links = [photo for photo, cached_photo in cached_photos.items() if cached_photo is None]
+    if unknown_links:
+        cached_photos.update(await load_photo_ids(links=unknown_links))
+    return [resolve_cached_photo(photo, cached_photos.get(photo)) for photo in photos]
+
+
+async def resolve_photo(photo: Link) -> Optional[PhotoID]:
+    """ Возвращает id загруженной в Telegram фотографии, исходную ссылку, если она неизвестна, или None """
+    resolved_photos = await resolve_photos([photo])
+    return resolved_photos[0]
+
+
+def resolve_cached_photo(photo: Link, cached_photo: Optional[str]) -> Optional[PhotoID]:
+    """ Возвращает фотографию по найденному в кэше значению """
+    if not is_photo_link(photo):
+        return photo
+    if cached_photo == BAD_PHOTO:
+        return None
+    if cached_photo is None or cached_photo == UNKNOWN_PHOTO:
+        return photo
+    return cached_photo
+
+
+async def load_photo_ids(links: list[Link]) -> dict[Link, str]:
+    """
+    Загружает известные id фотографий из базы данных в кэш и возвращает загруженные значения.
+    Отсутствие ссылки в базе тоже кэшируется ненадолго
+    """
+    try:
+        documents = await get_photo_ids_collection().find({'_id': {'$in': links}}).to_list(length=None)
+    except PyMongoError as error:
+        logger.warning('Photo ids are unavailable: %r', error)
+        return dict()
+    now = datetime.now(timezone.utc)
+    loaded_photos: dict[Link, str] = dict()
+    for document in documents:
+        expires_at: Optional[datetime] = document.get('expires_at')
+        if document.get('bad') and expires_at is not None:
+            ttl = (expires_at.replace(tzinfo=timezone.utc) - now).total_seconds()
+            if ttl > 0:
+                photo_ids_cache.set(document['_id'], BAD_PHOTO, ttl=ttl)
+                loaded_photos[document['_id']] = BAD_PHOTO
+        elif document.get('file_id'):
+            photo_ids_cache.set(document['_id'], document['file_id'])
+            loaded_photos[document['_id']] = document['file_id']
+    for link in set(links) - loaded_photos.keys():
+        photo_ids_cache.set(link, UNKNOWN_PHOTO, ttl=UNKNOWN_PHOTO_TTL)
+        loaded_photos[link] = UNKNOWN_PHOTO
+    return loaded_photos
+
+
+def remember_photo_id(photo: Link, message: Message):
+    """ Запоминает id фотографии, которую Telegram загрузил по ссылке. Запись в БД выполняется в фоне """
+    if not is_photo_link(photo) or not message.photo:
+        return
+    file_id: PhotoID = message.photo[-1].file_id
+    if photo_ids_cache.peek(photo) == file_id:
+        return
+    photo_ids_cache.set(photo, file_id)
+    photo_ids_write_queue.put(UpdateOne({'_id': photo},
+                                        {'$set': {'file_id': file_id}, '$unset': {'bad': '', 'expires_at': ''}},
+                                        upsert=True))
+
+
+def forget_photo_id(photo: Link):
+    """ Забывает устаревший id фотографии, чтобы следующая отправка загрузила ее по ссылке заново """
+    photo_ids_cache.pop(photo)
+    photo_ids_write_queue.put(UpdateOne({'_id': photo}, {'$unset': {'file_id': ''}}))
+
+
+async def send_resolved_photo(send: Callable[[Union[PhotoID, Link]], Awaitable[Union[Message, bool]]],
+                              photo: Link, resolved_photo: Union[PhotoID, Link]) -> Union[Message, bool]:
+    """
+    Отправляет фотографию функцией send по id, уже загруженной в Telegram, или по ссылке.
+    Если Telegram не знает id, он забывается, и фотография один раз отправляется по ссылке.
+    Ссылка, по которой Telegram не смог загрузить фотографию, запоминается как недоступная
+    """
+    if resolved_photo != photo:
+        try:
+            return await send(resolved_photo)
+        except WrongFileIdentifier:
+            forget_photo_id(photo)
+    try:
+        message = await send(photo)
+    except InvalidHTTPUrlContent:
+        remember_bad_photo(photo)
+        raise
+    if isinstance(message, Message):
+        remember_photo_id(photo, message)
+    return message
+
+
+def remember_bad_photo(photo: Link):
+    """
+    Запоминает ссылку, по которой Telegram не смог загрузить фотографию, чтобы сразу отправлять текст.
+    Через BAD_PHOTO_TTL секунд отметка удаляется, и ссылка проверяется снова
+    """
+    if not is_photo_link(photo):
+        return
+    ttl = config.cache.bad_photo_ttl
+    photo_ids_cache.set(photo, BAD_PHOTO, ttl=ttl)
+    expires_at = datetime.now(timezone.utc) + timedelta(seconds=ttl)
+    photo_ids_write_queue.put(UpdateOne({'_id': photo},
+                                        {'$set': {'bad': True, 'expires_at': expires_at}, '$unset': {'file_id': ''}},
+                                        upsert=True))
@@ -0,0 +1,31 @@
+from typing import Optional, TYPE_CHECKING
+
+from tgbot.config import RedisConfig
+
+if TYPE_CHECKING:
+    from aioredis import Redis
+
+# aioredis импортируется только при подключении к Redis: без USE_REDIS бот не зависит от него
+_redis: Optional['Redis'] = None
+
+
+async def setup_redis(config: RedisConfig) -> 'Redis':
+    """ Создает общее для всего процесса подключение к Redis """
+    from aioredis import Redis
+    global _redis
+    _redis = Redis(host=config.host, port=config.port, db=config.db, password=config.password)
+    return _redis
+
+
+def get_redis() -> Optional['Redis']:
+    """ Возвращает общее подключение к Redis или None, если Redis не используется """
+    return _redis
+
+
+async def close_redis():
+    """ Закрывает подключение к Redis """
+    global _redis
+    if _redis is not None:
+        await _redis.close()
+        await _redis.connection_pool.disconnect()
+    _redis = None
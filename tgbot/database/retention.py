@@ -0,0 +1,85 @@
+from datetime import datetime, timedelta, timezone
+
+from typing import Optional
+
+from motor.motor_asyncio import AsyncIOMotorClientSession
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+
+from tgbot.config import load_config
+from tgbot.database.client import get_searches_collection
+from tgbot.database.history_cache import history_cache
+from tgbot.database.write_behind import history_write_queue
+from tgbot.misc.named_tuples import CompactionReport
+
+config = load_config(".env")
+
+EXPIRY_INDEX_NAME = 'created_at_ttl'
+
+
+async def ensure_expiry_index():
+    """ Создает TTL-индекс, по которому MongoDB сама удаляет устаревшие поиски. Обновляет срок, если он изменился """
+    collection = get_searches_collection()
+    expire_after = int(timedelta(days=config.history.ttl_days).total_seconds())
+    try:
+        await collection.create_index([('created_at', ASCENDING)], name=EXPIRY_INDEX_NAME,
+                                      expireAfterSeconds=expire_after)
+    except OperationFailure:
+        await collection.database.command('collMod', collection.name,
+                                          index={'name': EXPIRY_INDEX_NAME, 'expireAfterSeconds': expire_after})
+
+
+async def trim_user_history(user_id: int, session: Optional[AsyncIOMotorClientSession] = None) -> int:
+    """
+    Удаляет самые старые поиски пользователя сверх допустимого количества.
+    Граница удаления - поиск, перед которым уже есть max_searches более новых поисков,
+    поэтому одновременные записи не могут удалить лишнего. При записи нового поиска вызывается
+    в той же транзакции, что и вставка. Возвращает количество удаленных поисков
+    """
+    collection = get_searches_collection()
+    cursor = collection.find({'user_id': user_id}, {'call_time': 1}, session=session).sort('call_time', DESCENDING)
+    boundary = await cursor.skip(config.history.max_searches).limit(1).to_list(length=1)
+    if not boundary:
+        return 0
+    result = await collection.delete_many({'user_id': user_id, 'call_time': {'$lte': boundary[0]['call_time']}},
+                                          session=session)
+    return result.deleted_count
+
+
+async def get_collection_size() -> int:
+    """ Возвращает размер данных коллекции истории в байтах """
+    collection = get_searches_collection()
+    stats = await collection.database.command('collStats', collection.name)
+    return stats.get('size', 0)
+
+
+async def compact_history() -> CompactionReport:
+    """
+    Приводит историю к ограничениям хранения: удаляет устаревшие поиски,
+    поиски сверх лимита на пользователя и отели сверх лимита на поиск.
+    Сначала записывает очередь истории, чтобы отложенные поиски тоже попали под ограничения
+    """
+    await history_write_queue.flush()
+    collection = get_searches_collection()
+    size_before = await get_collection_size()
+
+    expired_since = datetime.now(timezone.utc) - timedelta(days=config.history.ttl_days)
+    expired = await collection.delete_many({'created_at': {'$lt': expired_since}})
+
+    over_limit = 0
+    users_over_limit = collection.aggregate([
+        {'$group': {'_id': '$user_id', 'searches': {'$sum': 1}}},
+        {'$match': {'searches': {'$gt': config.history.max_searches}}},
+    ])
+    async for user in users_over_limit:
+        over_limit += await trim_user_history(user_id=user['_id'])
+
+    max_hotels = config.history.max_hotels
+    trimmed = await collection.update_many({f'found_hotels.{max_hotels}': {'$exists': True}},
+                                           {'$push': {'found_hotels': {'$each': [], '$slice': max_hotels}}})
+
+    history_cache.clear()
+    size_after = await get_collection_size()
+    return CompactionReport(expired_searches=expired.deleted_count, over_limit_searches=over_limit,
+                            trimmed_searches=trimmed.modified_count,
+                            reclaimed_bytes=max(size_before - size_after, 0))
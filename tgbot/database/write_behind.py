@@ -0,0 +1,134 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Optional, Union
+
+from motor.motor_asyncio import AsyncIOMotorClientSession, AsyncIOMotorCollection
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from tgbot.config import load_config
+from tgbot.database.client import get_searches_collection
+
+logger = logging.getLogger(__name__)
+
+WriteOperation = Union[InsertOne, UpdateOne]
+AfterWrite = Callable[[Optional[AsyncIOMotorClientSession]], Awaitable]
+
+
+class WriteBehindQueue:
+    """
+    Очередь отложенной записи в MongoDB. Операции копятся в памяти и записываются одним bulk_write,
+    когда их набирается max_batch или проходит flush_interval секунд. Порядок операций сохраняется.
+    После записи операций выполняются переданные с ними действия. Если очередь транзакционная,
+    операции и действия выполняются в одной транзакции: либо записываются вместе, либо не записываются совсем
+    """
+    def __init__(self, get_collection: Callable[[], AsyncIOMotorCollection], max_batch: int, flush_interval: float,
+                 transactional: bool = False):
+        self.get_collection = get_collection
+        self.max_batch: int = max_batch
+        self.flush_interval: float = flush_interval
+        self.transactional: bool = transactional
+        self._operations: list[WriteOperation] = list()
+        self._after_write: list[AfterWrite] = list()
+        self._flush_lock = asyncio.Lock()
+        self._batch_ready = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._operations)
+
+    def put(self, operation: WriteOperation, after_write: AfterWrite = None):
+        """
+        Добавляет операцию в очередь. Не ждет записи в базу данных.
+        after_write получает сессию транзакции (None, если очередь не транзакционная)
+        """
+        self._operations.append(operation)
+        if after_write is not None:
+            self._after_write.append(after_write)
+        if len(self._operations) >= self.max_batch:
+            self._batch_ready.set()
+
+    def start(self):
+        """ Запускает фоновую запись очереди. Вызывается при запуске бота """
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._batch_ready.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._batch_ready.clear()
+            try:
+                await self.flush()
+            except Exception as error:
+                logger.exception('History write batch failed unexpectedly: %r', error)
+
+    async def flush(self):
+        """
+        Записывает все накопленные операции в базу данных. Запись упорядоченная: если операция не удалась,
+        она пропускается, а остальные операции записываются следующим bulk_write.
+        Транзакция с ошибкой откатывается целиком, поэтому тогда повторяются и операции перед пропущенной
+        """
+        async with self._flush_lock:
+            operations, self._operations = self._operations, list()
+            after_write, self._after_write = self._after_write, list()
+            while operations:
+                try:
+                    await self._write(operations, after_write)
+                    operations = list()
+                except BulkWriteError as error:
+                    write_error = error.details['writeErrors'][0]
+                    failed_index = write_error['index']
+                    logger.error('History write operation %r failed: %s', operations[failed_index],
+                                 write_error.get('errmsg'))
+                    if self.transactional:
+                        operations = operations[:failed_index] + operations[failed_index + 1:]
+                    else:
+                        operations = operations[failed_index + 1:]
+                except PyMongoError as error:
+                    logger.warning('History write batch postponed: %r', error)
+                    self._operations[:0] = operations
+                    self._after_write[:0] = after_write
+                    return
+            if self.transactional:
+                return
+            for action in after_write:
+                try:
+                    await action(None)
+                except PyMongoError as error:
+                    logger.warning('Action after history write failed: %r', error)
+
+    async def _write(self, operations: list[WriteOperation], after_write: list[AfterWrite]):
+        """ Записывает операции одним bulk_write. В транзакционной очереди вместе с ними выполняет действия """
+        collection = self.get_collection()
+        if not self.transactional:
+            await collection.bulk_write(operations, ordered=True)
+            return
+
+        async def write_in_transaction(session: AsyncIOMotorClientSession):
+            await collection.bulk_write(operations, ordered=True, session=session)
+            for action in after_write:
+                await action(session)
+
+        async with await collection.database.client.start_session() as session:
+            await session.with_transaction(write_in_transaction)
+
+    async def close(self):
+        """ Останавливает фоновую запись и записывает оставшиеся операции. Вызывается при остановке бота """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+config = load_config(".env")
+history_write_queue = WriteBehindQueue(get_collection=get_searches_collection,
+                                       max_batch=config.history.write_batch_size,
+                                       flush_interval=config.history.write_flush_interval,
+                                       transactional=True)
@@ -1,7 +1,12 @@
 from aiogram import Dispatcher, types
 from aiogram.dispatcher import FSMContext
 
+from tgbot.config import Config
+from tgbot.database.photo_ids import photo_ids_cache
+from tgbot.database.retention import compact_history
 from tgbot.keyboards.reply import start
+from tgbot.rapidapi.hotels_request import cities_cache
+from tgbot.sharding.worker import get_workers_health
 
 
 async def admin_start(message: types.Message):
@@ -20,7 +25,59 @@ async def go_home(message: types.Message, state: FSMContext):
     await admin_start(message)
 
 
+async def show_cache_stats(message: types.Message):
+    """ Отправляет администратору статистику кэша городов и кэша фотографий """
+    text = (*format_cache_stats('Кэш городов', cities_cache.stats()),
+            '',
+            *format_cache_stats('Кэш фотографий', photo_ids_cache.stats()))
+    await message.answer('\n'.join(text))
+
+
+def format_cache_stats(title: str, stats: dict) -> tuple[str, ...]:
+    """ Возвращает строки со статистикой кэша """
+    return (f'<b>{title}:</b>',
+            f'Записей: {stats["size"]} из {stats["maxsize"]}',
+            f'Попаданий: {stats["hits"]}',
+            f'Промахов: {stats["misses"]}',
+            f'Доля попаданий: {stats["hit_rate"]:.1%}')
+
+
+async def run_history_compaction(message: types.Message):
+    """ Запускает очистку истории по ограничениям хранения и отправляет администратору отчет """
+    search = await message.answer('<i>Выполняю очистку истории...</i>')
+    report = await compact_history()
+    text = ('<b>Очистка истории завершена:</b>',
+            f'Удалено устаревших поисков: {report.expired_searches}',
+            f'Удалено поисков сверх лимита: {report.over_limit_searches}',
+            f'Сокращено списков отелей: {report.trimmed_searches}',
+            f'Освобождено: {report.reclaimed_bytes / 1024:.1f} КБ')
+    await search.edit_text('\n'.join(text))
+
+
+async def show_workers_health(message: types.Message):
+    """ Отправляет администратору состояние процессов-обработчиков """
+    config: Config = message.bot.get('config')
+    if config.sharding.workers == 1:
+        await message.answer('Бот работает в одном процессе')
+        return
+    worker_urls = config.sharding.worker_urls()
+    workers_health = await get_workers_health(worker_urls)
+    text = [f'<b>Процессы-обработчики ({sum(health is not None for health in workers_health)} '
+            f'из {len(worker_urls)} работают):</b>']
+    for worker_id, health in enumerate(workers_health):
+        if health is None:
+            text.append(f'❌ #{worker_id}: не отвечает')
+            continue
+        text.append(f'✅ #{worker_id} (pid {health["pid"]}): работает {health["uptime"]} с, '
+                    f'обработано {health["processed"]}, ошибок {health["failed"]}, '
+                    f'в очереди {health["in_progress"]}, память {health["peak_rss_mb"]} МБ')
+    await message.answer('\n'.join(text))
+
+
 def register_admin(dp: Dispatcher):
     """ Функция регистрации хендлеров """
     dp.register_message_handler(admin_start, commands=["start"], state="*", is_admin=True)
+    dp.register_message_handler(show_cache_stats, commands=["cache_stats"], state="*", is_admin=True)
+    dp.register_message_handler(show_workers_health, commands=["workers"], state="*", is_admin=True)
+    dp.register_message_handler(run_history_compaction, commands=["compact_history"], state="*", is_admin=True)
     dp.register_message_handler(go_to_main_menu, text='🏠 Главное меню', state='*')
@@ -3,25 +3,32 @@ from aiogram.dispatcher import FSMContext
 from aiogram.dispatcher.filters import Command, Text
 from aiogram.types import CallbackQuery
 
-from tgbot.database.client import get_history_collection
-from tgbot.database.history import get_my_history, SandedHistory, get_found_hotels_of_command
+from tgbot.database.history import get_my_history, SandedHistory, get_found_hotels_of_command, clear_history
+from tgbot.config import load_config
 from tgbot.keyboards.inline import generate_history_page_keyboard, create_history_page_close_keyboard, \
-    create_history_page_show_keyboard
+    create_history_page_show_keyboard, create_history_navigation_keyboard
 from tgbot.keyboards.reply import create_history_menu
+from tgbot.misc.albums import send_hotels_as_albums
+from tgbot.misc.delivery import bulk_delivery
 from tgbot.misc.errors import finish_with_error
-from tgbot.misc.named_tuples import HistoryPage, HotelMessage
+from tgbot.misc.message_refs import message_ref
+from tgbot.misc.named_tuples import HistorySlice, HotelMessage
 from tgbot.misc.states import History
 from tgbot.rapidapi.parse_responses import trying_to_send_with_photo
 
+config = load_config(".env")
+
 
 async def show_history(message: types.Message, state: FSMContext):
-    """ Отправляет пользователю его историю по команде 'history' """
+    """ Отправляет пользователю последние страницы его истории по команде 'history' """
     await History.show_history.set()
-    user_history: list[HistoryPage] = await get_my_history(message=message)
-    if not user_history:
+    user_history: HistorySlice = await get_my_history(user_id=message.chat.id, limit=config.history.page_size)
+    if not user_history.pages:
         await finish_with_error(message=message, error='history_empty')
         return
-    history_to_delete: SandedHistory = await send_history_pages(message, user_history)
+    history_caption = await message.answer(text='<b>История поиска:</b>', reply_markup=create_history_menu())
+    history_to_delete = SandedHistory(history_caption=message_ref(history_caption))
+    await send_history_pages(message, user_history, history_to_delete)
     await state.update_data(history_to_delete=history_to_delete)
 
 
@@ -30,17 +37,38 @@ async def show_history_text(message: types.Message, state: FSMContext):
     await show_history(message=message, state=state)
 
 
-async def send_history_pages(message: types.Message, history: list[HistoryPage]) -> SandedHistory:
-    """ Отправляет страницы истории пользователю """
-    history_caption = await message.answer(text='<b>История поиска:</b>', reply_markup=create_history_menu())
-    sanded_history = SandedHistory(history_caption=history_caption)
-    for history_page in history:
-        keyboard = await generate_history_page_keyboard(user_id=message.chat.id,
-                                                        command_call_time=history_page.command_call_time)
-        command_call_info = await message.answer(text=history_page.text, reply_markup=keyboard)
-        sanded_history.add_new_command_message(command_call_info)
-
-    return sanded_history
+async def send_history_pages(message: types.Message, history: HistorySlice, sanded_history: SandedHistory):
+    """ Отправляет страницы истории пользователю и кнопки перехода к более ранним и более поздним поискам """
+    with bulk_delivery():
+        for history_page in history.pages:
+            keyboard = generate_history_page_keyboard(command_call_time=history_page.command_call_time,
+                                                      has_hotels=history_page.has_hotels)
+            command_call_info = await message.answer(text=history_page.text, reply_markup=keyboard)
+            sanded_history.add_new_command_message(command_call_info)
+    if not history.has_older and not history.has_newer:
+        return
+    older_than = history.pages[0].command_call_time if history.has_older else None
+    newer_than = history.pages[-1].command_call_time if history.has_newer else None
+    navigation = await message.answer(text='<b>Другие поиски:</b>',
+                                      reply_markup=create_history_navigation_keyboard(older_than=older_than,
+                                                                                      newer_than=newer_than))
+    sanded_history.add_new_command_message(navigation)
+
+
+async def show_other_history_pages(call: CallbackQuery, state: FSMContext):
+    """ Заменяет текущие страницы истории на более ранние или более поздние """
+    await call.answer()
+    if call.data.startswith('history_older'):
+        user_history = await get_my_history(user_id=call.message.chat.id, limit=config.history.page_size,
+                                            older_than=call.data.lstrip('history_older'))
+    else:
+        user_history = await get_my_history(user_id=call.message.chat.id, limit=config.history.page_size,
+                                            newer_than=call.data.lstrip('history_newer'))
+    state_data = await state.get_data()
+    sanded_history_messages: SandedHistory = state_data.get('history_to_delete')
+    await sanded_history_messages.delete_screen_messages()
+    await send_history_pages(call.message, user_history, sanded_history_messages)
+    await state.update_data(history_to_delete=sanded_history_messages)
 
 
 async def show_hotels_of_command(call: CallbackQuery, state: FSMContext):
@@ -51,10 +79,14 @@ async def show_hotels_of_command(call: CallbackQuery, state: FSMContext):
                                                                          call_time=command_call_time)
     state_data = await state.get_data()
     sanded_history_messages: SandedHistory = state_data.get('history_to_delete')
-    for hotel_message in found_hotels:
-        message_with_hotel = await trying_to_send_with_photo(message_from_user=call.message,
-                                                             hotel_message=hotel_message)
-        sanded_history_messages.add_new_found_hotel(command_cal_time=command_call_time, hotel=message_with_hotel)
+    with bulk_delivery():
+        if config.history.hotels_as_albums:
+            messages_with_hotels = await send_hotels_as_albums(message_from_user=call.message, hotels=found_hotels)
+        else:
+            messages_with_hotels = [await trying_to_send_with_photo(message_from_user=call.message,
+                                                                    hotel_message=hotel_message)
+                                    for hotel_message in found_hotels]
+    sanded_history_messages.add_new_found_hotels(command_cal_time=command_call_time, hotels=messages_with_hotels)
 
     await state.update_data(history_to_delete=sanded_history_messages)
 
@@ -78,12 +110,6 @@ async def clear_user_history(message: types.Message, state: FSMContext):
     await finish_with_error(message=message, error='history_empty')
 
 
-async def clear_history(user_id: int):
-    """ Очистить всю историю пользователей в БД """
-    collection = get_history_collection()
-    await collection.update_one({'_id': user_id}, {'$set': {'history': {}}})
-
-
 def register_history(dp: Dispatcher):
     dp.register_message_handler(show_history, Command('history'), state='*')
     dp.register_message_handler(show_history_text, Text('📁 История поиска'), state='*')
@@ -91,4 +117,6 @@ def register_history(dp: Dispatcher):
                                        state=History.show_history)
     dp.register_callback_query_handler(close_hotels_of_command, Text(startswith='close_history_page'),
                                        state=History.show_history)
+    dp.register_callback_query_handler(show_other_history_pages, Text(startswith=['history_older', 'history_newer']),
+                                       state=History.show_history)
     dp.register_message_handler(clear_user_history, Text('❌ Очистить историю'), state=History.show_history)
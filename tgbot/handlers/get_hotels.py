@@ -7,10 +7,11 @@ from aiogram.types import ReplyKeyboardRemove, CallbackQuery, Message
 
 from tgbot.database.history import add_command_to_history, add_city_to_history
 from tgbot.keyboards.inline import price_range_keyboard, distance_range_keyboard, create_calendar, CustomCalendar, \
-    CUSTOM_STEPS, is_correct_markup
+    CUSTOM_STEPS, is_correct_markup, stars_keyboard
 from tgbot.misc.dates import get_readable_date
 from tgbot.misc.errors import is_message_error, finish_with_error, delete_errors_messages
-from tgbot.misc.named_tuples import KM
+from tgbot.misc.message_refs import message_ref, edit_message_text_by_ref
+from tgbot.misc.named_tuples import KM, MessageRef
 from tgbot.misc.states import SelectCity, SelectDates, BestDeal, GetHotels
 from tgbot.rapidapi.hotels_request import create_cities_message
 
@@ -104,9 +105,9 @@ async def send_min_price_request(call: CallbackQuery, state: FSMContext):
     await call.message.edit_reply_markup(reply_markup=None)
     message = await call.message.answer('<b>Отправьте минимальную цену в $</b>\n'
                                         'Пример: <b>100</b> или <b>50</b>')
-    await state.update_data(message_to_delete=message)
+    await state.update_data(message_to_delete=message_ref(message))
     await state.update_data(errors_messages=[])
-    await state.update_data(message_to_edit=call.message)
+    await state.update_data(message_to_edit=message_ref(call.message))
 
     await BestDeal.wait_min_price.set()
 
@@ -114,29 +115,27 @@ async def send_min_price_request(call: CallbackQuery, state: FSMContext):
 async def get_min_price(message: types.Message, state: FSMContext):
     """ Получает минимальную цену и проверяет ее """
     state_data = await state.get_data()
-    errors: list[Message] = state_data.get('errors_messages')
+    errors: list[MessageRef] = state_data.get('errors_messages')
     try:
         price = int(message.text)
     except ValueError:
         error_message = await message.answer('<b>❗️Отправьте боту число!</b>')
-        errors.extend([error_message, message])
+        errors.extend([message_ref(error_message), message_ref(message)])
         await state.update_data(errors_messages=errors)
         return
     max_price = state_data.get('max_price')
     if max_price is not None:
         if max_price < price:
             error_message = await message.answer('<b>❗️Минимальная стоимость должна быть меньше максимальной!</b>')
-            errors.extend([error_message, message])
+            errors.extend([message_ref(error_message), message_ref(message)])
             await state.update_data(errors_messages=errors)
             return
-    message_from_bot: Message = state_data.get('message_to_delete')
+    message_from_bot: MessageRef = state_data.get('message_to_delete')
     message_from_user: Message = message
-    message_with_select_price: Message = state_data.get('message_to_edit')
-    await message_from_bot.delete()
-    await message_from_user.delete()
+    message_with_select_price: MessageRef = state_data.get('message_to_edit')
 
     await state.update_data(min_price=price)
-    await delete_errors_messages(message_list=errors)
+    await delete_errors_messages(message_list=[message_from_bot, message_ref(message_from_user), *errors])
     await state.update_data(errors_messages=[])
     await edit_price_message(message_to_edit=message_with_select_price, state=state)
     await BestDeal.select_price_range.set()
@@ -147,43 +146,41 @@ async def send_max_price_request(call: CallbackQuery, state: FSMContext):
     await call.message.edit_reply_markup(reply_markup=None)
     message = await call.message.answer('<b>Отправьте максимальную цену в $</b>\n'
                                         'Пример: <b>100</b> или <b>50</b>')
-    await state.update_data(message_to_delete=message)
-    await state.update_data(message_to_edit=call.message)
+    await state.update_data(message_to_delete=message_ref(message))
+    await state.update_data(message_to_edit=message_ref(call.message))
     await BestDeal.wait_max_price.set()
 
 
 async def get_max_price(message: Message, state: FSMContext):
     """ Получает максимальную цену и проверяет ее """
     state_data = await state.get_data()
-    errors: list[Message] = state_data.get('errors_messages')
+    errors: list[MessageRef] = state_data.get('errors_messages')
     try:
         price = int(message.text)
     except ValueError:
         error_message = await message.answer('<b>Отправьте боту число!</b>')
-        errors.extend([error_message, message])
+        errors.extend([message_ref(error_message), message_ref(message)])
         await state.update_data(errors_messages=errors)
         return
     min_price = state_data.get('min_price')
     if min_price is not None:
         if min_price > price:
             error_message = await message.answer('<b>❗️Максимальная стоимость должна быть больше минимальной!</b>')
-            errors.extend([error_message, message])
+            errors.extend([message_ref(error_message), message_ref(message)])
             await state.update_data(errors_messages=errors)
             return
-    message_from_bot: Message = state_data.get('message_to_delete')
+    message_from_bot: MessageRef = state_data.get('message_to_delete')
     message_from_user: Message = message
-    message_with_select_price: Message = state_data.get('message_to_edit')
-    await message_from_bot.delete()
-    await message_from_user.delete()
+    message_with_select_price: MessageRef = state_data.get('message_to_edit')
 
     await state.update_data(max_price=price)
-    await delete_errors_messages(message_list=errors)
+    await delete_errors_messages(message_list=[message_from_bot, message_ref(message_from_user), *errors])
     await state.update_data(errors_messages=[])
     await edit_price_message(message_to_edit=message_with_select_price, state=state)
     await BestDeal.select_price_range.set()
 
 
-async def edit_price_message(message_to_edit: Message, state: FSMContext):
+async def edit_price_message(message_to_edit: MessageRef, state: FSMContext):
     """ Редактирует сообщение с информацией о ценовом диапазоне """
     state_data = await state.get_data()
     min_price, max_price = state_data.get('min_price'), state_data.get('max_price')
@@ -198,7 +195,7 @@ async def edit_price_message(message_to_edit: Message, state: FSMContext):
                f'Минимальная цена: <b>{min_price} $</b>\n' \
                f'Максимальная цена: <b>{max_price} $</b>'
 
-    await message_to_edit.edit_text(text=text, reply_markup=price_range_keyboard())
+    await edit_message_text_by_ref(message_to_edit, text=text, reply_markup=price_range_keyboard())
 
 
 async def end_price_range_selecting(call: CallbackQuery, state: FSMContext):
@@ -227,43 +224,41 @@ async def send_max_distance_request(call: CallbackQuery, state: FSMContext):
     await call.message.edit_reply_markup(reply_markup=None)
     message = await call.message.answer('<b>Отправьте максимальную удаленность от центра в Км</b>\n'
                                         'Пример: <b>5</b> или <b>10</b>')
-    await state.update_data(message_to_delete=message)
+    await state.update_data(message_to_delete=message_ref(message))
     await state.update_data(errors_messages=[])
-    await state.update_data(message_to_edit=call.message)
+    await state.update_data(message_to_edit=message_ref(call.message))
     await BestDeal.wait_max_distance.set()
 
 
 async def get_max_distance(message: Message, state: FSMContext):
     """ Получает максимальное расстояние и проверяет его """
     state_data = await state.get_data()
-    errors: list[Message] = state_data.get('errors_messages')
+    errors: list[MessageRef] = state_data.get('errors_messages')
     try:
         distance: KM = float(message.text)
     except ValueError:
         error_message = await message.answer('<b>❗️Отправьте боту число!</b>')
-        errors.extend([error_message, message])
+        errors.extend([message_ref(error_message), message_ref(message)])
         await state.update_data(errors_messages=errors)
         return
-    message_from_bot: Message = state_data.get('message_to_delete')
+    message_from_bot: MessageRef = state_data.get('message_to_delete')
     message_from_user: Message = message
-    message_with_select_distance: Message = state_data.get('message_to_edit')
-    await message_from_bot.delete()
-    await message_from_user.delete()
+    message_with_select_distance: MessageRef = state_data.get('message_to_edit')
 
     await state.update_data(max_distance=distance)
-    await delete_errors_messages(message_list=errors)
+    await delete_errors_messages(message_list=[message_from_bot, message_ref(message_from_user), *errors])
     await state.update_data(errors_messages=[])
     await edit_distance_message(message_to_edit=message_with_select_distance, state=state)
     await BestDeal.select_distance_range.set()
 
 
-async def edit_distance_message(message_to_edit: Message, state: FSMContext):
+async def edit_distance_message(message_to_edit: MessageRef, state: FSMContext):
     """ Редактирует сообщение с информацией о максимальном расстоянии """
     state_data = await state.get_data()
     max_distance = state_data.get('max_distance')
     text = f'<b>Укажите максимальную удаленность от центра</b>\n' \
            f'Максимальное расстояние: <b>{max_distance} Км</b>'
-    await message_to_edit.edit_text(text=text, reply_markup=distance_range_keyboard())
+    await edit_message_text_by_ref(message_to_edit, text=text, reply_markup=distance_range_keyboard())
 
 
 async def end_distance_range_selecting(call: CallbackQuery, state: FSMContext):
@@ -272,6 +267,24 @@ async def end_distance_range_selecting(call: CallbackQuery, state: FSMContext):
     if state_data.get('max_distance') is None:
         await state.update_data(max_distance=1000)
     await call.message.edit_text('<b>🏠 Диапазон расстояния выбран!</b>')
+    await start_select_min_stars(call, state)
+
+
+async def start_select_min_stars(call: CallbackQuery, state: FSMContext):
+    """ Запускает выбор минимального количества звезд отеля """
+    await state.update_data(min_stars=0)
+    await BestDeal.select_min_stars.set()
+    await call.message.answer('<b>Укажите минимальное количество звезд отеля</b>\n'
+                              'С этим условием бот подберет лучшие по цене и расстоянию отели '
+                              'среди нескольких страниц поиска', reply_markup=stars_keyboard())
+
+
+async def select_min_stars(call: CallbackQuery, state: FSMContext):
+    """ Получает минимальное количество звезд отеля. Начинает выбирать даты """
+    min_stars = int(call.data.lstrip('min_stars'))
+    await state.update_data(min_stars=min_stars)
+    text = f'<b>⭐ Отели от {min_stars} звезд!</b>' if min_stars else '<b>⭐ Отели с любым количеством звезд!</b>'
+    await call.message.edit_text(text)
     await SelectDates.start_select_date_in.set()
     await start_select_date_in(call=call)
 
@@ -396,6 +409,8 @@ def register_hotels(dp: Dispatcher):
     dp.register_message_handler(get_max_distance, state=BestDeal.wait_max_distance)
     dp.register_callback_query_handler(end_distance_range_selecting, Text(startswith='end_distance_range'),
                                        state=BestDeal.select_distance_range)
+    dp.register_callback_query_handler(select_min_stars, Text(startswith='min_stars'),
+                                       state=BestDeal.select_min_stars)
     dp.register_callback_query_handler(select_date_in, state=SelectDates.select_date_in)
     dp.register_callback_query_handler(select_date_out, state=SelectDates.select_date_out)
     dp.register_callback_query_handler(send_confirmation_date, state=SelectDates.is_date_correct)
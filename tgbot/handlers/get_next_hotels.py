@@ -1,21 +1,27 @@
-from aiogram import Dispatcher, Bot
+from typing import Optional, Union
+
+from aiogram import Dispatcher
 from aiogram.dispatcher import FSMContext
 from aiogram.dispatcher.filters import Text
 from aiogram.types import CallbackQuery, Message, InputMediaPhoto
 
 from tgbot.config import load_config
 from tgbot.database.history import add_hotel_to_history
+from tgbot.database.photo_ids import resolve_photo, resolve_photos, send_resolved_photo
 from tgbot.keyboards.inline import create_map_keyboard, create_photos_keyboard
 from tgbot.keyboards.reply import show_more_hotels_keyboard
 from tgbot.misc.errors import is_message_error, finish_with_error
 from tgbot.misc.named_tuples import HotelInfo, HotelMessage, ID, Link
+from tgbot.misc.prefetch import hotels_prefetcher
 from tgbot.misc.states import GetHotels, SelectCity
+from tgbot.rapidapi.bestdeal import bestdeal_searches
+from tgbot.rapidapi.hotels_registry import hotels_registry, hotels_to_session
 from tgbot.rapidapi.hotels_request import create_hotel_message
+from tgbot.rapidapi.lazy_hotels import LazyHotelsPage, lazy_hotels_pages, load_lazy_hotels_page
 from tgbot.rapidapi.parse_responses import trying_to_send_with_photo, get_hotels_info, is_last_page, \
-    get_hotel_photo_links
+    get_hotel_photo_links, is_ranked_search
 
 config = load_config(".env")
-bot = Bot(token=config.tg_bot.token, parse_mode='HTML')
 
 
 async def find_hotels_if_info_correct(call: CallbackQuery, state: FSMContext):
@@ -34,17 +40,68 @@ async def find_hotels_if_info_correct(call: CallbackQuery, state: FSMContext):
 async def send_new_hotel(message: Message, state: FSMContext):
     """ Отправляет сообщение о другом отеле """
     state_data = await state.get_data()
+    if is_streamed_bestdeal(state_data):
+        await send_new_bestdeal_hotel(message=message, state=state, state_data=state_data)
+        return
+    if is_lazy_search(state_data):
+        await send_new_lazy_hotel(message=message, state=state, state_data=state_data)
+        return
     hotel_index, hotels_page = state_data.get('hotel_index'), state_data.get('hotels_page')
-    hotels_info: list[HotelInfo] = state_data.get('hotels_info')
-    if hotel_index == len(hotels_info):
+    hotel_ids: list[ID] = state_data.get('hotel_ids')
+    if hotel_index == len(hotel_ids):
         await send_first_hotel(message=message, state=state, page=hotels_page + 1)
         await state.update_data(hotels_page=hotels_page + 1)
         return
-    hotel = hotels_info[hotel_index]
+    hotel = await get_hotel_from_registry(state_data=state_data, hotel_index=hotel_index)
+    if hotel is None:
+        await finish_with_error(message, error='bad_result')
+        return
     hotel_message: HotelMessage = create_hotel_message(hotel_info=hotel)
     message_with_hotel = await trying_to_send_with_photo(message_from_user=message, hotel_message=hotel_message)
     await add_hotel_to_history(message=message_with_hotel, call_time=state_data.get('command_call_time'))
     await state.update_data(hotel_index=hotel_index + 1)
+    start_next_page_prefetch(state=state, state_data=state_data, shown_hotels=hotel_index + 1)
+
+
+def start_next_page_prefetch(state: FSMContext, state_data: dict, shown_hotels: int):
+    """
+    Запускает фоновую загрузку следующей страницы отелей,
+    когда пользователь просмотрел заданную долю отелей текущей страницы
+    """
+    if state_data.get('last_page'):
+        return
+    hotels_amount = state_data.get('hotels_amount') or len(state_data.get('hotel_ids'))
+    if shown_hotels < hotels_amount * config.search.prefetch_threshold:
+        return
+    next_page = state_data.get('hotels_page') + 1
+    load_page = load_lazy_hotels_page if is_lazy_search(state_data) else get_hotels_info
+    hotels_prefetcher.start(key=(state.chat, state.user), page=next_page,
+                            request=lambda: load_page(data=state_data, page=next_page))
+
+
+async def get_hotel_from_registry(state_data: dict, hotel_index: int) -> Optional[HotelInfo]:
+    """
+    Возвращает отель текущей страницы из общего реестра отелей.
+    Если отель был вытеснен из реестра, страница загружается заново
+    """
+    hotel_id: ID = state_data.get('hotel_ids')[hotel_index]
+    total_cost, cost_by_night = state_data.get('hotel_costs')[hotel_index]
+    hotel = hotels_registry.get(hotel_id, total_cost=total_cost, cost_by_night=cost_by_night)
+    if hotel is not None:
+        return hotel
+    hotels_info = await get_hotels_info(data=state_data, page=state_data.get('hotels_page'))
+    if is_message_error(message=hotels_info):
+        return None
+    hotels_registry.add(hotels_info)
+    return hotels_registry.get(hotel_id, total_cost=total_cost, cost_by_night=cost_by_night)
+
+
+async def load_hotels_page(state: FSMContext, state_data: dict, page: int) -> Union[list[HotelInfo], dict]:
+    """ Возвращает страницу отелей, загруженную в фоне, или загружает ее, если фоновой загрузки не было """
+    hotels_info = await hotels_prefetcher.take(key=(state.chat, state.user), page=page)
+    if hotels_info is None or is_message_error(message=hotels_info):
+        hotels_info = await get_hotels_info(data=state_data, page=page)
+    return hotels_info
 
 
 async def send_first_hotel(message: Message, state: FSMContext, page: int):
@@ -52,26 +109,139 @@ async def send_first_hotel(message: Message, state: FSMContext, page: int):
     await message.delete()
     search = await message.answer('<i>Выполняю поиск...</i>')
     state_data = await state.get_data()
+    if is_streamed_bestdeal(state_data):
+        await send_first_bestdeal_hotel(message=message, state=state, state_data=state_data, search=search)
+        return
     if state_data.get('last_page'):
         await finish_with_error(message, error='page_index')
         return
-    hotels_info: list[HotelInfo] = await get_hotels_info(data=state_data, page=page)
+    if is_lazy_search(state_data):
+        await send_first_lazy_hotel(message=message, state=state, state_data=state_data, search=search, page=page)
+        return
+    hotels_info: list[HotelInfo] = await load_hotels_page(state=state, state_data=state_data, page=page)
     if is_message_error(message=hotels_info):
         error = hotels_info.get('error')
         await finish_with_error(message, error=error)
         return
-    await state.update_data(hotels_info=hotels_info, hotel_index=1)
+    hotels_registry.add(hotels_info)
+    await state.update_data(hotel_index=1, **hotels_to_session(hotels_info))
     hotel_info: HotelInfo = hotels_info[0]
     hotel_message = create_hotel_message(hotel_info)
     await message.chat.delete_message(search.message_id)
     await message.answer('<b>Найденные отели:</b>', reply_markup=show_more_hotels_keyboard())
     message_with_hotel = await trying_to_send_with_photo(message_from_user=message, hotel_message=hotel_message)
     await add_hotel_to_history(message=message_with_hotel, call_time=state_data.get('command_call_time'))
-    if is_last_page(hotels_info):
+    if is_last_page(hotels_info) or is_ranked_search(state_data):
         await state.update_data(last_page=True)
     await GetHotels.get_hotels_menu.set()
 
 
+def is_streamed_bestdeal(state_data: dict) -> bool:
+    """ Проверяет, показываются ли отели поиска лучших предложений по мере загрузки страниц """
+    return state_data.get('command_type') == 'bestdeal' and not is_ranked_search(state_data)
+
+
+async def send_first_bestdeal_hotel(message: Message, state: FSMContext, state_data: dict, search: Message):
+    """
+    Запускает поиск лучших предложений и отправляет первый подходящий отель, как только он найден.
+    Остальные страницы загружаются в фоне, пока пользователь просматривает отели
+    """
+    bestdeal_search = bestdeal_searches.start(key=(state.chat, state.user), data=state_data)
+    hotel_info = await bestdeal_search.get(0)
+    if hotel_info is None:
+        await finish_with_error(message, error=bestdeal_search.error or 'hotels_not_found')
+        return
+    await state.update_data(hotel_index=1)
+    await message.chat.delete_message(search.message_id)
+    await message.answer('<b>Найденные отели:</b>', reply_markup=show_more_hotels_keyboard())
+    message_with_hotel = await trying_to_send_with_photo(message_from_user=message,
+                                                         hotel_message=create_hotel_message(hotel_info))
+    await add_hotel_to_history(message=message_with_hotel, call_time=state_data.get('command_call_time'))
+    await GetHotels.get_hotels_menu.set()
+
+
+async def send_new_bestdeal_hotel(message: Message, state: FSMContext, state_data: dict):
+    """
+    Отправляет следующий отель поиска лучших предложений.
+    Если поиск был потерян (например, после перезапуска бота), он запускается заново
+    """
+    key = (state.chat, state.user)
+    bestdeal_search = bestdeal_searches.get(key) or bestdeal_searches.start(key=key, data=state_data)
+    hotel_index = state_data.get('hotel_index')
+    hotel_info = await bestdeal_search.get(hotel_index)
+    if hotel_info is None:
+        await finish_with_error(message, error=bestdeal_search.error or 'page_index')
+        return
+    message_with_hotel = await trying_to_send_with_photo(message_from_user=message,
+                                                         hotel_message=create_hotel_message(hotel_info))
+    await add_hotel_to_history(message=message_with_hotel, call_time=state_data.get('command_call_time'))
+    await state.update_data(hotel_index=hotel_index + 1)
+
+
+def is_lazy_search(state_data: dict) -> bool:
+    """ Проверяет, создается ли информация об отелях страницы по мере просмотра """
+    return config.search.lazy_parsing and not is_ranked_search(state_data)
+
+
+async def load_lazy_page(state: FSMContext, state_data: dict, page: int) -> Union[LazyHotelsPage, dict]:
+    """
+    Возвращает страницу отелей, загруженную в фоне, или загружает ее, если фоновой загрузки не было.
+    Страница запоминается, чтобы разбирать следующие отели по мере просмотра
+    """
+    key = (state.chat, state.user)
+    hotels_page = await hotels_prefetcher.take(key=key, page=page)
+    if not isinstance(hotels_page, LazyHotelsPage):
+        hotels_page = await load_lazy_hotels_page(data=state_data, page=page)
+    if isinstance(hotels_page, LazyHotelsPage):
+        lazy_hotels_pages.set(key, hotels_page)
+    return hotels_page
+
+
+async def send_first_lazy_hotel(message: Message, state: FSMContext, state_data: dict, search: Message, page: int):
+    """ Отправляет первый отель страницы, разобрав только его. Остальные отели разбираются по мере просмотра """
+    hotels_page = await load_lazy_page(state=state, state_data=state_data, page=page)
+    if is_message_error(message=hotels_page):
+        await finish_with_error(message, error=hotels_page.get('error'))
+        return
+    hotel_info = hotels_page.get(0)
+    if hotel_info is None:
+        await finish_with_error(message, error='bad_result' if hotels_page.size else 'hotels_not_found')
+        return
+    await state.update_data(hotel_index=1, hotels_amount=hotels_page.size)
+    await message.chat.delete_message(search.message_id)
+    await message.answer('<b>Найденные отели:</b>', reply_markup=show_more_hotels_keyboard())
+    message_with_hotel = await trying_to_send_with_photo(message_from_user=message,
+                                                         hotel_message=create_hotel_message(hotel_info))
+    await add_hotel_to_history(message=message_with_hotel, call_time=state_data.get('command_call_time'))
+    if hotels_page.is_last:
+        await state.update_data(last_page=True)
+    await GetHotels.get_hotels_menu.set()
+
+
+async def send_new_lazy_hotel(message: Message, state: FSMContext, state_data: dict):
+    """
+    Отправляет следующий отель страницы, разбирая его только сейчас.
+    Если страница была потеряна (например, после перезапуска бота), она загружается заново
+    """
+    hotel_index, page = state_data.get('hotel_index'), state_data.get('hotels_page')
+    hotels_page = lazy_hotels_pages.get((state.chat, state.user))
+    if hotels_page is None:
+        hotels_page = await load_lazy_page(state=state, state_data=state_data, page=page)
+        if is_message_error(message=hotels_page):
+            await finish_with_error(message, error=hotels_page.get('error'))
+            return
+    hotel_info = hotels_page.get(hotel_index)
+    if hotel_info is None:
+        await send_first_hotel(message=message, state=state, page=page + 1)
+        await state.update_data(hotels_page=page + 1)
+        return
+    message_with_hotel = await trying_to_send_with_photo(message_from_user=message,
+                                                         hotel_message=create_hotel_message(hotel_info))
+    await add_hotel_to_history(message=message_with_hotel, call_time=state_data.get('command_call_time'))
+    await state.update_data(hotel_index=hotel_index + 1)
+    start_next_page_prefetch(state=state, state_data=state_data, shown_hotels=hotel_index + 1)
+
+
 async def change_info(call: CallbackQuery):
     """ Отправляет пользователю запрос о новой информации для поиска """
     await call.answer('Укажите информацию заново', show_alert=True)
@@ -85,8 +255,8 @@ async def get_hotel_map(call: CallbackQuery):
     Содержит две ссылки на популярные приложения для карт
     """
     latitude, longitude = map(float, call.data.lstrip('get_hotel_map').split('/'))
-    await bot.send_location(chat_id=call.message.chat.id, latitude=latitude, longitude=longitude,
-                            reply_markup=create_map_keyboard(latitude, longitude))
+    await call.bot.send_location(chat_id=call.message.chat.id, latitude=latitude, longitude=longitude,
+                                 reply_markup=create_map_keyboard(latitude, longitude))
 
 
 async def get_hotel_photos(call: CallbackQuery, state: FSMContext):
@@ -97,6 +267,11 @@ async def get_hotel_photos(call: CallbackQuery, state: FSMContext):
     if is_message_error(photo_links):
         await finish_with_error(call.message, error=photo_links.get('error'))
         return
+    resolved_photos = await resolve_photos(photo_links)
+    photo_links = [link for link, photo in zip(photo_links, resolved_photos) if photo is not None]
+    if not photo_links:
+        await finish_with_error(call.message, error='bad_result')
+        return
     await state.update_data(photos=photo_links)
     await send_hotel_photo(message=call.message, found_photos=photo_links)
 
@@ -110,18 +285,31 @@ async def show_hotel_photo(call: CallbackQuery, state: FSMContext):
 
 
 async def send_hotel_photo(message: Message, found_photos: list[Link]):
-    """ Отправляет первую фотографию отеля """
-    await bot.send_photo(chat_id=message.chat.id,
-                         photo=found_photos[0],
-                         reply_markup=create_photos_keyboard(len(found_photos)))
+    """ Отправляет первую фотографию отеля. Уже загруженная в Telegram фотография отправляется по id """
+    photo_link = found_photos[0]
+
+    async def send_photo(photo: str) -> Message:
+        return await message.bot.send_photo(chat_id=message.chat.id, photo=photo,
+                                            reply_markup=create_photos_keyboard(len(found_photos)))
+
+    resolved_photo = await resolve_photo(photo_link) or photo_link
+    await send_resolved_photo(send_photo, photo=photo_link, resolved_photo=resolved_photo)
 
 
 async def send_new_hotel_photo(message: Message, found_photos: list, photo_index: int = 1):
     """ Редактирует сообщение paginator с фотографией отеля по номеру страницы """
-    await bot.edit_message_media(chat_id=message.chat.id,
-                                 message_id=message.message_id,
-                                 media=InputMediaPhoto(found_photos[photo_index - 1]),
-                                 reply_markup=create_photos_keyboard(len(found_photos), page=photo_index))
+    photo_link = found_photos[photo_index - 1]
+
+    async def edit_photo(photo: str) -> Union[Message, bool]:
+        return await message.bot.edit_message_media(
+            chat_id=message.chat.id,
+            message_id=message.message_id,
+            media=InputMediaPhoto(photo),
+            reply_markup=create_photos_keyboard(len(found_photos), page=photo_index)
+        )
+
+    resolved_photo = await resolve_photo(photo_link) or photo_link
+    await send_resolved_photo(edit_photo, photo=photo_link, resolved_photo=resolved_photo)
 
 
 async def close_message(call: CallbackQuery):
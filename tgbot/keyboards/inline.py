@@ -5,7 +5,6 @@ from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from telegram_bot_calendar import DetailedTelegramCalendar
 from telegram_bot_pagination import InlineKeyboardPaginator
 
-from tgbot.database.client import get_history_collection
 from tgbot.misc.named_tuples import HotelInfo, CalendarMarkupAndStep, Degrees
 
 
@@ -86,6 +85,16 @@ def distance_range_keyboard():
     return keyboard
 
 
+def stars_keyboard() -> InlineKeyboardMarkup:
+    """ Создает встроенную клавиатуру для выбора минимального количества звезд отеля """
+    keyboard = InlineKeyboardMarkup(row_width=3)
+    stars_buttons = [InlineKeyboardButton(f'от {stars} ⭐', callback_data=f'min_stars{stars}') for stars in (3, 4, 5)]
+    any_stars_button = InlineKeyboardButton('Любое количество', callback_data='min_stars0')
+    keyboard.add(*stars_buttons)
+    keyboard.row(any_stars_button)
+    return keyboard
+
+
 def inline_markup_from_dict() -> InlineKeyboardMarkup:  # dictionary: dict
     """ Преобразует клавиатурный dict во встроенную разметку"""
     keyboard = InlineKeyboardMarkup()
@@ -115,10 +124,9 @@ def create_photos_keyboard(photos_amount: int, page: int = 1) -> InlineKeyboardM
     return paginator.markup
 
 
-async def generate_history_page_keyboard(user_id: int, command_call_time: str) -> Optional[InlineKeyboardMarkup]:
+def generate_history_page_keyboard(command_call_time: str, has_hotels: bool) -> Optional[InlineKeyboardMarkup]:
     """ Создает встроенную клавиатуру с кнопкой отображения истории, если отели были найдены вызванной командой """
-    is_hotels = await is_hotels_were_found(user_id, command_call_time)
-    if not is_hotels:
+    if not has_hotels:
         return None
     keyboard = InlineKeyboardMarkup()
     show_hotels_button = InlineKeyboardButton('⬇️ Показать найденные отели',
@@ -127,15 +135,6 @@ async def generate_history_page_keyboard(user_id: int, command_call_time: str) -
     return keyboard
 
 
-async def is_hotels_were_found(user_id, call_time: str) -> bool:
-    """ Проверяет, были ли найдены отели после вызова команды """
-    collection = get_history_collection()
-    user: dict = await collection.find_one({'_id': user_id})
-    history = user['history']
-    found_hotels = history[call_time]['found_hotels']
-    return True if found_hotels else False
-
-
 def create_history_page_close_keyboard(command_call_time: str) -> InlineKeyboardMarkup:
     """ Создает клавиатуру с кнопкой закрытия истории """
     keyboard = InlineKeyboardMarkup()
@@ -152,3 +151,15 @@ def create_history_page_show_keyboard(command_call_time: str) -> InlineKeyboardM
                                               callback_data=f'show_history_page{command_call_time}')
     keyboard.row(show_hotels_button)
     return keyboard
+
+
+def create_history_navigation_keyboard(older_than: Optional[str], newer_than: Optional[str]) -> InlineKeyboardMarkup:
+    """ Создает клавиатуру перехода к более ранним и более поздним поискам в истории """
+    keyboard = InlineKeyboardMarkup()
+    buttons = list()
+    if older_than is not None:
+        buttons.append(InlineKeyboardButton('⬅️ Ранее', callback_data=f'history_older{older_than}'))
+    if newer_than is not None:
+        buttons.append(InlineKeyboardButton('Позже ➡️', callback_data=f'history_newer{newer_than}'))
+    keyboard.row(*buttons)
+    return keyboard
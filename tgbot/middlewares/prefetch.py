@@ -0,0 +1,34 @@
+from typing import Union
+
+from aiogram import Dispatcher, types
+from aiogram.dispatcher.middlewares import BaseMiddleware
+
+from tgbot.misc.prefetch import HotelsPrefetcher
+from tgbot.misc.states import GetHotels
+from tgbot.rapidapi.bestdeal import BestDealSearches
+from tgbot.rapidapi.lazy_hotels import LazyHotelsPages
+
+
+class PrefetchCancelMiddleware(BaseMiddleware):
+    """ Отменяет фоновую загрузку отелей и забывает страницы, когда пользователь выходит из меню просмотра отелей """
+    def __init__(self, *prefetchers: Union[HotelsPrefetcher, BestDealSearches, LazyHotelsPages]):
+        super().__init__()
+        self.prefetchers = prefetchers
+
+    async def on_post_process_message(self, message: types.Message, results: list, data: dict):
+        await self.cancel_if_menu_left(chat=message.chat.id, user=message.from_user.id)
+
+    async def on_post_process_callback_query(self, call: types.CallbackQuery, results: list, data: dict):
+        chat = call.message.chat.id if call.message else call.from_user.id
+        await self.cancel_if_menu_left(chat=chat, user=call.from_user.id)
+
+    async def cancel_if_menu_left(self, chat: int, user: int):
+        """ Отменяет загрузку, если после обработки обновления пользователь не в меню отелей """
+        key = (chat, user)
+        prefetchers = [prefetcher for prefetcher in self.prefetchers if prefetcher.has(key)]
+        if not prefetchers:
+            return
+        state = await Dispatcher.get_current().current_state(chat=chat, user=user).get_state()
+        if state != GetHotels.get_hotels_menu.state:
+            for prefetcher in prefetchers:
+                prefetcher.cancel(key)
@@ -0,0 +1,58 @@
+import logging
+
+from aiogram.types import Message, MediaGroup, InputMediaPhoto
+from aiogram.utils.exceptions import BadRequest
+
+from tgbot.misc.named_tuples import HotelMessage
+from tgbot.rapidapi.parse_responses import trying_to_send_with_photo
+
+logger = logging.getLogger(__name__)
+
+MEDIA_GROUP_LIMIT = 10
+MESSAGE_LENGTH_LIMIT = 4096
+NO_PHOTO = 'link_not_found'
+
+
+async def send_hotels_as_albums(message_from_user: Message, hotels: list[HotelMessage]) -> list[Message]:
+    """
+    Отправляет отели альбомами: отели с фотографиями - группами по 10 фото с подписями,
+    отели без фотографий - одним текстовым сообщением. Возвращает все отправленные сообщения
+    """
+    with_photo = [hotel for hotel in hotels if hotel.photo and hotel.photo != NO_PHOTO]
+    without_photo = [hotel for hotel in hotels if not hotel.photo or hotel.photo == NO_PHOTO]
+    sent_messages: list[Message] = list()
+    for start in range(0, len(with_photo), MEDIA_GROUP_LIMIT):
+        album = with_photo[start:start + MEDIA_GROUP_LIMIT]
+        sent_messages.extend(await send_album(message_from_user=message_from_user, hotels=album))
+    for text in join_hotels_texts(hotels=without_photo):
+        sent_messages.append(await message_from_user.answer(text=text))
+    return sent_messages
+
+
+async def send_album(message_from_user: Message, hotels: list[HotelMessage]) -> list[Message]:
+    """
+    Отправляет до 10 отелей одним альбомом.
+    Если Telegram не принял альбом (например, из-за недоступной фотографии), отправляет отели по одному
+    """
+    if len(hotels) == 1:
+        return [await trying_to_send_with_photo(message_from_user=message_from_user, hotel_message=hotels[0])]
+    parse_mode = message_from_user.bot.parse_mode
+    media = MediaGroup([InputMediaPhoto(media=hotel.photo, caption=hotel.text, parse_mode=parse_mode)
+                        for hotel in hotels])
+    try:
+        return await message_from_user.bot.send_media_group(chat_id=message_from_user.chat.id, media=media)
+    except BadRequest as error:
+        logger.warning('Sending hotels album failed, sending hotels one by one: %s', error)
+    return [await trying_to_send_with_photo(message_from_user=message_from_user, hotel_message=hotel)
+            for hotel in hotels]
+
+
+def join_hotels_texts(hotels: list[HotelMessage]) -> list[str]:
+    """ Объединяет тексты отелей в как можно меньшее количество сообщений с учетом ограничения на длину """
+    texts: list[str] = list()
+    for hotel in hotels:
+        if texts and len(texts[-1]) + len(hotel.text) + 2 <= MESSAGE_LENGTH_LIMIT:
+            texts[-1] += '\n\n' + hotel.text
+        else:
+            texts.append(hotel.text)
+    return texts
@@ -0,0 +1,71 @@
+import asyncio
+import json
+import logging
+from itertools import groupby
+from typing import Iterable, Optional
+
+from aiogram import Bot
+from aiogram.utils.exceptions import MessageCantBeDeleted, MessageToDeleteNotFound, NotFound, TelegramAPIError
+
+from tgbot.config import load_config
+from tgbot.misc.named_tuples import MessageRef
+
+logger = logging.getLogger(__name__)
+
+DELETE_MESSAGES_LIMIT = 100
+
+config = load_config(".env")
+_is_batch_delete_supported: Optional[bool] = None
+
+
+async def delete_messages(refs: Iterable[MessageRef]):
+    """
+    Удаляет набор сообщений. Использует пакетный метод Telegram deleteMessages, если сервер его поддерживает,
+    иначе удаляет сообщения по одному с ограниченным количеством одновременных запросов.
+    Уже удаленные сообщения пропускаются
+    """
+    refs = sorted(set(refs))
+    for chat_id, chat_refs in groupby(refs, key=lambda ref: ref.chat_id):
+        message_ids = [ref.message_id for ref in chat_refs]
+        for start in range(0, len(message_ids), DELETE_MESSAGES_LIMIT):
+            chunk = message_ids[start:start + DELETE_MESSAGES_LIMIT]
+            if not await try_batch_delete(chat_id=chat_id, message_ids=chunk):
+                await delete_one_by_one(chat_id=chat_id, message_ids=chunk)
+
+
+async def try_batch_delete(chat_id: int, message_ids: list[int]) -> bool:
+    """ Пытается удалить сообщения одним запросом. Возвращает False, если это не удалось """
+    global _is_batch_delete_supported
+    if _is_batch_delete_supported is False or len(message_ids) == 1:
+        return False
+    try:
+        await Bot.get_current().request('deleteMessages', {'chat_id': chat_id, 'message_ids': json.dumps(message_ids)})
+    except NotFound:
+        logger.info('Bot API server does not support deleteMessages, deleting messages one by one')
+        _is_batch_delete_supported = False
+        return False
+    except TelegramAPIError as error:
+        logger.warning('Batch delete in chat %s failed: %s', chat_id, error)
+        return False
+    _is_batch_delete_supported = True
+    return True
+
+
+async def delete_one_by_one(chat_id: int, message_ids: list[int]):
+    """
+    Удаляет сообщения по одному с ограниченным количеством одновременных запросов.
+    Ошибка удаления одного сообщения не мешает удалить остальные
+    """
+    bot = Bot.get_current()
+    semaphore = asyncio.Semaphore(config.delivery.cleanup_concurrency)
+
+    async def delete(message_id: int):
+        async with semaphore:
+            try:
+                await bot.delete_message(chat_id=chat_id, message_id=message_id)
+            except (MessageToDeleteNotFound, MessageCantBeDeleted):
+                pass
+            except TelegramAPIError as error:
+                logger.warning('Deleting message %s in chat %s failed: %s', message_id, chat_id, error)
+
+    await asyncio.gather(*map(delete, message_ids))
@@ -0,0 +1,181 @@
+import asyncio
+import contextvars
+import itertools
+import logging
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Optional, Union
+
+from aiogram import Bot
+from aiogram.utils.exceptions import RetryAfter
+
+from tgbot.config import DeliveryConfig
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = 0
+BULK = 1
+
+THROTTLED_METHOD_PREFIXES = ('send', 'edit', 'copy', 'forward')
+MAX_CHAT_BUCKETS = 10000
+
+delivery_priority: contextvars.ContextVar[int] = contextvars.ContextVar('delivery_priority', default=INTERACTIVE)
+
+
+@contextmanager
+def bulk_delivery():
+    """ Отправляет запросы внутри блока с низким приоритетом, пропуская вперед ответы пользователям """
+    token = delivery_priority.set(BULK)
+    try:
+        yield
+    finally:
+        delivery_priority.reset(token)
+
+
+class TokenBucket:
+    """ Ограничитель частоты запросов: rate запросов в секунду с допустимым всплеском capacity """
+    def __init__(self, rate: float, capacity: float):
+        self.rate: float = rate
+        self.capacity: float = capacity
+        self.tokens: float = capacity
+        self.updated_at: float = time.monotonic()
+        self.paused_until: float = 0.0
+
+    def delay(self, now: float) -> float:
+        """ Возвращает, сколько секунд осталось ждать до следующего запроса """
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if now < self.paused_until:
+            return self.paused_until - now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        """ Расходует разрешение на один запрос """
+        self.tokens -= 1
+
+    def pause(self, seconds: float):
+        """ Запрещает запросы на заданное время. Используется, когда Telegram просит подождать """
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0
+
+
+class DeliveryScheduler:
+    """
+    Планировщик исходящих запросов к Telegram. Выдает разрешения на отправку с учетом
+    общего ограничения и ограничения на каждый чат. Запросы с более высоким приоритетом выполняются первыми
+    """
+    def __init__(self, config: DeliveryConfig):
+        self.config: DeliveryConfig = config
+        self._global = TokenBucket(rate=config.global_rate, capacity=config.global_burst)
+        self._chats: OrderedDict[Union[int, str], TokenBucket] = OrderedDict()
+        self._waiters: list[tuple[int, int, Union[int, str], asyncio.Future]] = list()
+        self._counter = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def chat_bucket(self, chat_id: Union[int, str]) -> TokenBucket:
+        """ Возвращает ограничитель чата """
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            bucket = TokenBucket(rate=self.config.chat_rate, capacity=self.config.chat_burst)
+            self._chats[chat_id] = bucket
+            if len(self._chats) > MAX_CHAT_BUCKETS:
+                self._chats.popitem(last=False)
+        self._chats.move_to_end(chat_id)
+        return bucket
+
+    async def acquire(self, chat_id: Union[int, str], priority: int):
+        """ Ждет разрешения на отправку запроса в чат """
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append((priority, next(self._counter), chat_id, waiter))
+        self._wakeup.set()
+        await waiter
+
+    def pause(self, chat_id: Optional[Union[int, str]], seconds: float):
+        """ Приостанавливает отправку в чат (или всю отправку, если чат неизвестен) """
+        bucket = self._global if chat_id is None else self.chat_bucket(chat_id)
+        bucket.pause(seconds)
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            delay = self._release_next()
+            if delay is None:
+                await self._wakeup.wait()
+                continue
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+
+    def _release_next(self) -> Optional[float]:
+        """
+        Выдает разрешение первому по приоритету запросу, чат которого не ограничен.
+        Возвращает время ожидания до следующей попытки или None, если очередь пуста
+        """
+        self._waiters = [waiter for waiter in self._waiters if not waiter[3].done()]
+        if not self._waiters:
+            return None
+        now = time.monotonic()
+        global_delay = self._global.delay(now)
+        if global_delay > 0:
+            return global_delay
+        min_delay = None
+        for waiter in sorted(self._waiters):
+            chat_id, future = waiter[2], waiter[3]
+            bucket = self.chat_bucket(chat_id)
+            chat_delay = bucket.delay(now)
+            if chat_delay == 0:
+                bucket.take()
+                self._global.take()
+                self._waiters.remove(waiter)
+                future.set_result(None)
+                return 0.0
+            min_delay = chat_delay if min_delay is None else min(min_delay, chat_delay)
+        return min_delay
+
+    async def close(self):
+        """ Останавливает планировщик. Вызывается при остановке бота """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for waiter in self._waiters:
+            waiter[3].cancel()
+        self._waiters = list()
+
+
+class ThrottledBot(Bot):
+    """
+    Бот, который отправляет запросы к Telegram через планировщик с ограничением частоты.
+    Если Telegram отвечает RetryAfter, запрос повторяется после указанной паузы
+    """
+    def __init__(self, *args, scheduler: DeliveryScheduler, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.scheduler: DeliveryScheduler = scheduler
+
+    async def request(self, method: str, data: Optional[dict] = None, files: Optional[dict] = None, **kwargs):
+        chat_id = (data or {}).get('chat_id')
+        is_throttled = chat_id is not None and method.startswith(THROTTLED_METHOD_PREFIXES)
+        attempt = 0
+        while True:
+            if is_throttled:
+                await self.scheduler.acquire(chat_id, priority=delivery_priority.get())
+            try:
+                return await super().request(method, data, files, **kwargs)
+            except RetryAfter as error:
+                attempt += 1
+                if attempt > self.scheduler.config.max_retries:
+                    raise
+                logger.warning('Flood control on %s in chat %s, retry in %s s', method, chat_id, error.timeout)
+                self.scheduler.pause(chat_id, error.timeout)
+                if not is_throttled:
+                    await asyncio.sleep(error.timeout)
@@ -2,6 +2,10 @@ from typing import Union
 
 from aiogram.types.message import Message
 
+from tgbot.misc.cleanup import delete_messages
+from tgbot.misc.message_refs import message_ref
+from tgbot.misc.named_tuples import MessageRef
+
 
 def is_message_error(message) -> bool:
     """ Проверяет, является ли функция возвращенным словарем с ошибкой """
@@ -21,6 +25,8 @@ def create_error_message(error_text: str) -> str:
         return template.format('История пуста')
     if error_text == 'empty':
         return template.format('Произошла ошибка при получении информации о городах. Попробуйте еще раз')
+    if error_text == 'rate_limited':
+        return template.format('Закончился лимит запросов к серверу поиска отелей. Попробуйте позже')
     if error_text == 'timeout':
         return template.format('Произошла ошибка на сервере. Попробуйте еще раз')
     if error_text == 'page_index':
@@ -33,12 +39,11 @@ async def finish_with_error(message: Message, error: str, to_delete: Union[tuple
     """ Отправляет пользователю сообщение об ошибке и завершает сценарий """
     await message.answer(text=create_error_message(error))
     if isinstance(to_delete, Message):
-        await to_delete.delete()
+        await delete_messages([message_ref(to_delete)])
 
 
-async def delete_errors_messages(message_list: list[Message]):
+async def delete_errors_messages(message_list: list[MessageRef]):
     """ Удаляет сообщения с ошибками, когда пользователь выбирает что-то в сценарии наилучшего предложения """
     if message_list is None:
         return
-    for message in message_list:
-        await message.delete()
+    await delete_messages(message_list)
@@ -0,0 +1,17 @@
+from typing import Optional
+
+from aiogram import Bot
+from aiogram.types import Message, InlineKeyboardMarkup
+
+from tgbot.misc.named_tuples import MessageRef
+
+
+def message_ref(message: Message) -> MessageRef:
+    """ Возвращает сериализуемую ссылку на сообщение вместо самого объекта сообщения """
+    return MessageRef(chat_id=message.chat.id, message_id=message.message_id)
+
+
+async def edit_message_text_by_ref(ref: MessageRef, text: str, reply_markup: Optional[InlineKeyboardMarkup] = None):
+    """ Редактирует текст сообщения по ссылке на него """
+    await Bot.get_current().edit_message_text(text=text, chat_id=ref.chat_id, message_id=ref.message_id,
+                                              reply_markup=reply_markup)
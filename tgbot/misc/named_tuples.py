@@ -34,6 +34,17 @@ class HotelInfo(NamedTuple):
     coordinates: tuple[Latitude, Longitude]
 
 
+class BestDealPage(NamedTuple):
+    hotels: list[HotelInfo]
+    is_last: bool
+
+
+class RankingWeights(NamedTuple):
+    price: float
+    distance: float
+    stars: float
+
+
 class HotelMessage(NamedTuple):
     text: str
     photo: Link
@@ -43,4 +54,22 @@ class HotelMessage(NamedTuple):
 class HistoryPage(NamedTuple):
     command_call_time: str
     text: str
-    found_hotels: list[HotelMessage]
+    has_hotels: bool
+
+
+class HistorySlice(NamedTuple):
+    pages: list[HistoryPage]
+    has_older: bool
+    has_newer: bool
+
+
+class MessageRef(NamedTuple):
+    chat_id: int
+    message_id: int
+
+
+class CompactionReport(NamedTuple):
+    expired_searches: int
+    over_limit_searches: int
+    trimmed_searches: int
+    reclaimed_bytes: int
@@ -0,0 +1,61 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+StorageKey = tuple[int, int]
+
+
+class HotelsPrefetcher:
+    """ Загружает следующую страницу отелей в фоне, пока пользователь просматривает текущую """
+    def __init__(self):
+        self._tasks: dict[StorageKey, tuple[int, asyncio.Task]] = dict()
+
+    def has(self, key: StorageKey) -> bool:
+        """ Проверяет, есть ли у пользователя фоновая загрузка """
+        return key in self._tasks
+
+    def start(self, key: StorageKey, page: int, request: Callable[[], Awaitable[Any]]):
+        """ Запускает фоновую загрузку страницы, если она еще не запущена """
+        prefetch = self._tasks.get(key)
+        if prefetch is not None:
+            prefetched_page, task = prefetch
+            if prefetched_page == page:
+                return
+            task.cancel()
+        self._tasks[key] = (page, asyncio.create_task(request()))
+
+    async def take(self, key: StorageKey, page: int) -> Optional[Any]:
+        """
+        Возвращает результат фоновой загрузки страницы, дождавшись ее завершения.
+        Возвращает None, если страница не загружалась или загрузка завершилась ошибкой
+        """
+        prefetch = self._tasks.pop(key, None)
+        if prefetch is None:
+            return None
+        prefetched_page, task = prefetch
+        if prefetched_page != page:
+            task.cancel()
+            return None
+        try:
+            return await task
+        except asyncio.CancelledError:
+            return None
+        except Exception as error:
+            logger.warning('Prefetch of hotels page %s failed: %r', page, error)
+            return None
+
+    def cancel(self, key: StorageKey):
+        """ Отменяет фоновую загрузку пользователя """
+        prefetch = self._tasks.pop(key, None)
+        if prefetch is not None:
+            prefetch[1].cancel()
+
+    def cancel_all(self):
+        """ Отменяет все фоновые загрузки. Вызывается при остановке бота """
+        for key in list(self._tasks):
+            self.cancel(key)
+
+
+hotels_prefetcher = HotelsPrefetcher()
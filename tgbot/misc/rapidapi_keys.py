@@ -1,25 +1,85 @@
-import os
-# Скрипт для изменения ключа Rapid Api, если был достигнут лимит запроса ключа
+import time
+from typing import Mapping, Optional
 
+# Пул ключей Rapid Api. Следит за остатком квоты каждого ключа по заголовкам ответа
+# и выбирает ключ с наибольшим запасом запросов
 
-def get_correct_rapidapi_key():
-    is_requests_amount_are_over = os.getenv('REQUESTS_LIMIT_REACHED')
-    if is_requests_amount_are_over == 'False':
-        return os.getenv('RAPID_API_KEY')
-    elif is_requests_amount_are_over == 'True':
-        return os.getenv('ANOTHER_RAPID_API_KEY')
+RAPIDAPI_HOST = "hotels4.p.rapidapi.com"
+REMAINING_HEADER = 'X-RateLimit-Requests-Remaining'
+RESET_HEADER = 'X-RateLimit-Requests-Reset'
+RETRY_AFTER_HEADER = 'Retry-After'
 
 
-def change_rapid_api_key():
-    is_requests_amount_are_over = os.getenv('REQUESTS_LIMIT_REACHED')
-    if is_requests_amount_are_over == 'False':
-        os.environ['REQUESTS_LIMIT_REACHED'] = 'True'
-    elif is_requests_amount_are_over == 'True':
-        os.environ['REQUESTS_LIMIT_REACHED'] = 'False'
+class RapidApiKey:
+    """ Ключ rapidapi с информацией об остатке квоты """
+    def __init__(self, key: str):
+        self.key: str = key
+        self.remaining: Optional[int] = None
+        self.cooldown_until: float = 0.0
 
+    def is_available(self, now: float) -> bool:
+        """ Проверяет, можно ли сейчас отправлять запросы с этим ключом """
+        return now >= self.cooldown_until
 
-def get_headers_by_correct_rapidapi_key() -> dict:
-    rapid_api_key = get_correct_rapidapi_key()
+    def headroom(self) -> float:
+        """ Возвращает запас запросов ключа. Ключ, по которому еще не было ответов, считается свободным """
+        return float('inf') if self.remaining is None else self.remaining
+
+
+class RapidApiKeyPool:
+    """ Пул ключей rapidapi """
+    def __init__(self, keys: list[str], cooldown: float):
+        self.keys: list[RapidApiKey] = [RapidApiKey(key) for key in dict.fromkeys(keys) if key]
+        self.cooldown: float = cooldown
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def choose(self, exclude: list[RapidApiKey] = ()) -> Optional[RapidApiKey]:
+        """ Выбирает доступный ключ с наибольшим запасом запросов. Возвращает None, если все ключи исчерпаны """
+        now = time.monotonic()
+        available = [api_key for api_key in self.keys
+                     if api_key.is_available(now) and api_key not in exclude]
+        if not available:
+            return None
+        return max(available, key=RapidApiKey.headroom)
+
+    def update_from_headers(self, api_key: RapidApiKey, headers: Mapping):
+        """ Обновляет остаток квоты ключа по заголовкам ответа rapidapi """
+        remaining = _header_to_number(headers, REMAINING_HEADER)
+        if remaining is None:
+            return
+        api_key.remaining = int(remaining)
+        if api_key.remaining <= 0:
+            self.cool_down(api_key, headers)
+
+    def cool_down(self, api_key: RapidApiKey, headers: Mapping = None):
+        """
+        Отключает исчерпанный ключ до сброса квоты.
+        Время ожидания берется из заголовков ответа, иначе используется значение из настроек.
+        После ожидания у ключа остается нулевой запас, пока его не обновят заголовки следующего ответа,
+        поэтому он выбирается последним
+        """
+        headers = headers or {}
+        delay = _header_to_number(headers, RETRY_AFTER_HEADER) or _header_to_number(headers, RESET_HEADER)
+        if not delay or delay <= 0:
+            delay = self.cooldown
+        api_key.cooldown_until = time.monotonic() + delay
+        api_key.remaining = 0
+
+
+def _header_to_number(headers: Mapping, name: str) -> Optional[float]:
+    """ Возвращает числовое значение заголовка или None, если заголовок отсутствует или некорректен """
+    value = headers.get(name)
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def get_headers_by_rapidapi_key(api_key: RapidApiKey) -> dict:
     return {
-        "X-RapidAPI-Key": rapid_api_key,
-        "X-RapidAPI-Host": "hotels4.p.rapidapi.com"}
+        "X-RapidAPI-Key": api_key.key,
+        "X-RapidAPI-Host": RAPIDAPI_HOST}
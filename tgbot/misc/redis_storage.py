@@ -0,0 +1,89 @@
+from datetime import date, datetime
+from typing import Any
+
+from aiogram.contrib.fsm_storage.redis import RedisStorage2
+
+from tgbot.config import RedisConfig
+from tgbot.database.history import SandedHistory
+from tgbot.misc.named_tuples import HotelInfo, MessageRef
+
+TYPE_KEY = '~t'
+VALUE_KEY = 'v'
+
+
+def hotel_info_to_row(hotel: HotelInfo) -> list:
+    """ Преобразует информацию об отеле в плоский список полей """
+    latitude, longitude = hotel.coordinates
+    return [hotel.hotel_id, hotel.name, hotel.stars, hotel.address, hotel.distance_from_center,
+            hotel.total_cost, hotel.cost_by_night, hotel.photo, latitude, longitude]
+
+
+def hotel_info_from_row(row: list) -> HotelInfo:
+    """ Восстанавливает информацию об отеле из плоского списка полей """
+    *fields, latitude, longitude = row
+    return HotelInfo(*fields, coordinates=(latitude, longitude))
+
+
+def encode_session_value(value: Any) -> Any:
+    """
+    Преобразует значение из состояния пользователя в компактный вид, пригодный для json.
+    Значения, которые json не поддерживает, сохраняются с меткой типа
+    """
+    if isinstance(value, HotelInfo):
+        return {TYPE_KEY: 'hotel', VALUE_KEY: hotel_info_to_row(value)}
+    if isinstance(value, MessageRef):
+        return {TYPE_KEY: 'ref', VALUE_KEY: list(value)}
+    if isinstance(value, SandedHistory):
+        return {TYPE_KEY: 'sanded_history', VALUE_KEY: value.to_dict()}
+    if isinstance(value, datetime):
+        return {TYPE_KEY: 'datetime', VALUE_KEY: value.isoformat()}
+    if isinstance(value, date):
+        return {TYPE_KEY: 'date', VALUE_KEY: value.isoformat()}
+    if isinstance(value, list) and value and all(isinstance(item, HotelInfo) for item in value):
+        return {TYPE_KEY: 'hotels', VALUE_KEY: list(map(hotel_info_to_row, value))}
+    if isinstance(value, (list, tuple)):
+        return [encode_session_value(item) for item in value]
+    if isinstance(value, dict):
+        return {key: encode_session_value(item) for key, item in value.items()}
+    return value
+
+
+def decode_session_value(value: Any) -> Any:
+    """ Восстанавливает значение состояния пользователя из компактного вида """
+    if isinstance(value, list):
+        return [decode_session_value(item) for item in value]
+    if not isinstance(value, dict):
+        return value
+    value_type = value.get(TYPE_KEY)
+    if value_type is None:
+        return {key: decode_session_value(item) for key, item in value.items()}
+    encoded = value[VALUE_KEY]
+    if value_type == 'hotel':
+        return hotel_info_from_row(encoded)
+    if value_type == 'hotels':
+        return list(map(hotel_info_from_row, encoded))
+    if value_type == 'ref':
+        return MessageRef(*encoded)
+    if value_type == 'sanded_history':
+        return SandedHistory.from_dict(encoded)
+    if value_type == 'datetime':
+        return datetime.fromisoformat(encoded)
+    if value_type == 'date':
+        return date.fromisoformat(encoded)
+    raise ValueError(f'Unknown session value type: {value_type}')
+
+
+class CompactRedisStorage(RedisStorage2):
+    """ Хранилище состояний в Redis, которое сериализует данные пользователя в компактный вид """
+    async def get_data(self, *, chat=None, user=None, default=None) -> dict:
+        data = await super().get_data(chat=chat, user=user, default=default)
+        return decode_session_value(data)
+
+    async def set_data(self, *, chat=None, user=None, data: dict = None):
+        await super().set_data(chat=chat, user=user, data=encode_session_value(data) if data else data)
+
+
+def create_redis_storage(config: RedisConfig) -> CompactRedisStorage:
+    """ Создает хранилище состояний в Redis с отдельным временем жизни состояния и данных пользователя """
+    return CompactRedisStorage(host=config.host, port=config.port, db=config.db, password=config.password,
+                               prefix='fsm', state_ttl=config.state_ttl, data_ttl=config.data_ttl)
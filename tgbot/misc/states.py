@@ -30,6 +30,7 @@ class BestDeal(StatesGroup):
     select_distance_range = State()
     wait_min_distance = State()
     wait_max_distance = State()
+    select_min_stars = State()
 
 
 class History(StatesGroup):
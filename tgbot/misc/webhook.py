@@ -0,0 +1,56 @@
+import hmac
+import logging
+import re
+from typing import Awaitable, Callable
+
+from aiogram import Bot
+from aiohttp import web
+
+from tgbot.config import WebhookConfig
+
+logger = logging.getLogger(__name__)
+
+SECRET_TOKEN_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+SECRET_TOKEN_PATTERN = re.compile(r'[A-Za-z0-9_-]{1,256}')
+
+Handler = Callable[[web.Request], Awaitable[web.StreamResponse]]
+
+
+def check_webhook_config(config: WebhookConfig):
+    """ Проверяет, что для режима webhook заданы адрес и секретный токен допустимого формата """
+    if not config.url:
+        raise ValueError('WEBHOOK_URL must be set when USE_WEBHOOK=True')
+    if not config.secret or SECRET_TOKEN_PATTERN.fullmatch(config.secret) is None:
+        raise ValueError('WEBHOOK_SECRET must be 1-256 characters: letters, digits, "_" and "-"')
+
+
+def create_secret_token_middleware(config: WebhookConfig):
+    """ Создает middleware, которое отклоняет запросы к webhook без правильного секретного токена Telegram """
+    secret = config.secret.encode()
+
+    @web.middleware
+    async def check_secret_token(request: web.Request, handler: Handler) -> web.StreamResponse:
+        if request.path == config.path:
+            token = request.headers.get(SECRET_TOKEN_HEADER, '').encode()
+            if not hmac.compare_digest(token, secret):
+                logger.warning('Rejected webhook request from %s: wrong secret token', request.remote)
+                raise web.HTTPUnauthorized()
+        return await handler(request)
+
+    return check_secret_token
+
+
+def create_web_app(config: WebhookConfig) -> web.Application:
+    """ Создает веб-приложение, через которое Telegram доставляет обновления боту """
+    check_webhook_config(config)
+    return web.Application(middlewares=[create_secret_token_middleware(config)])
+
+
+async def set_bot_webhook(bot: Bot, config: WebhookConfig):
+    """
+    Сообщает Telegram адрес webhook и секретный токен. Вызывается при запуске каждого экземпляра бота,
+    поэтому экземпляры за балансировщиком нагрузки должны использовать одинаковые WEBHOOK_URL и WEBHOOK_SECRET
+    """
+    webhook_url = config.url.rstrip('/') + config.path
+    await bot.set_webhook(url=webhook_url, secret_token=config.secret)
+    logger.info('Webhook is set to %s', webhook_url)
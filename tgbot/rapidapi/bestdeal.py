@@ -0,0 +1,146 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from tgbot.config import load_config
+from tgbot.misc.named_tuples import HotelInfo
+from tgbot.rapidapi.parse_responses import fetch_bestdeal_page
+
+logger = logging.getLogger(__name__)
+
+HOTELS_PAGE_SIZE = 25
+
+StorageKey = tuple[int, int]
+
+
+class BestDealSearch:
+    """
+    Поиск лучших предложений. Загружает страницы отелей в фоне, не более fanout страниц одновременно,
+    и добавляет подходящие отели по порядку расстояния, как только страница загружена.
+    Загружает страницы только впрок на одну страницу вперед от просмотренных пользователем отелей
+    и останавливается, когда расстояние отелей превышает максимальное
+    """
+    def __init__(self, data: dict, fanout: int):
+        self.data: dict = data
+        self.fanout: int = fanout
+        self.hotels: list[HotelInfo] = list()
+        self.error: Optional[str] = None
+        self.finished: bool = False
+        self._wanted: int = 1
+        self._condition = asyncio.Condition()
+        self._task: asyncio.Task = asyncio.create_task(self._run())
+
+    async def get(self, index: int) -> Optional[HotelInfo]:
+        """ Возвращает отель по номеру, дождавшись его загрузки, или None, если подходящие отели закончились """
+        async with self._condition:
+            self._wanted = max(self._wanted, index + 1)
+            self._condition.notify_all()
+            await self._condition.wait_for(lambda: len(self.hotels) > index or self.finished)
+        return self.hotels[index] if index < len(self.hotels) else None
+
+    def cancel(self):
+        """ Останавливает загрузку страниц """
+        self._task.cancel()
+
+    def _needs_more_hotels(self) -> bool:
+        return len(self.hotels) < self._wanted + HOTELS_PAGE_SIZE
+
+    async def _run(self):
+        pending: dict[int, asyncio.Task] = dict()
+        try:
+            await self._load_pages(pending)
+        except Exception as error:
+            logger.exception('Bestdeal search failed: %r', error)
+            self.error = self.error or 'bad_result'
+        finally:
+            for task in pending.values():
+                task.cancel()
+            async with self._condition:
+                self.finished = True
+                self._condition.notify_all()
+
+    async def _load_pages(self, pending: dict[int, asyncio.Task]):
+        next_page = 1
+        while True:
+            async with self._condition:
+                await self._condition.wait_for(self._needs_more_hotels)
+            while len(pending) < self.fanout:
+                page = next_page + len(pending)
+                pending[page] = asyncio.create_task(fetch_bestdeal_page(data=self.data, page=page))
+            bestdeal_page = await pending.pop(next_page)
+            if isinstance(bestdeal_page, dict):
+                logger.warning('Bestdeal page %s failed: %s', next_page, bestdeal_page.get('error'))
+                if not self.hotels:
+                    self.error = bestdeal_page.get('error')
+                return
+            async with self._condition:
+                self.hotels.extend(bestdeal_page.hotels)
+                self._condition.notify_all()
+            if bestdeal_page.is_last:
+                return
+            next_page += 1
+
+
+class BestDealSearches:
+    """
+    Поиски лучших предложений пользователей, которые сейчас просматривают найденные отели.
+    Хранится не больше maxsize поисков: давно не использованные поиски и поиски, к которым не обращались
+    ttl секунд, останавливаются и забываются
+    """
+    def __init__(self, fanout: int, maxsize: int, ttl: float):
+        self.fanout: int = fanout
+        self.maxsize: int = maxsize
+        self.ttl: float = ttl
+        self._searches: OrderedDict[StorageKey, tuple[float, BestDealSearch]] = OrderedDict()
+
+    def has(self, key: StorageKey) -> bool:
+        """ Проверяет, есть ли у пользователя поиск """
+        self._evict()
+        return key in self._searches
+
+    def get(self, key: StorageKey) -> Optional[BestDealSearch]:
+        """ Возвращает поиск пользователя и продлевает время его жизни """
+        self._evict()
+        item = self._searches.get(key)
+        if item is None:
+            return None
+        search = item[1]
+        self._searches[key] = (time.monotonic(), search)
+        self._searches.move_to_end(key)
+        return search
+
+    def start(self, key: StorageKey, data: dict) -> BestDealSearch:
+        """ Запускает новый поиск пользователя, предыдущий поиск останавливается """
+        self.cancel(key)
+        search = BestDealSearch(data=data, fanout=self.fanout)
+        self._searches[key] = (time.monotonic(), search)
+        self._evict()
+        return search
+
+    def cancel(self, key: StorageKey):
+        """ Останавливает поиск пользователя и забывает найденные отели """
+        item = self._searches.pop(key, None)
+        if item is not None:
+            item[1].cancel()
+
+    def cancel_all(self):
+        """ Останавливает все поиски. Вызывается при остановке бота """
+        for key in list(self._searches):
+            self.cancel(key)
+
+    def _evict(self):
+        """ Останавливает устаревшие поиски и самые давно использованные поиски сверх maxsize """
+        expired_before = time.monotonic() - self.ttl
+        while self._searches:
+            key, (used_at, _) = next(iter(self._searches.items()))
+            if used_at > expired_before and len(self._searches) <= self.maxsize:
+                return
+            self.cancel(key)
+
+
+config = load_config(".env")
+bestdeal_searches = BestDealSearches(fanout=config.search.bestdeal_fanout,
+                                     maxsize=config.search.bestdeal_searches_maxsize,
+                                     ttl=config.search.bestdeal_searches_ttl)
@@ -0,0 +1,66 @@
+from typing import Optional
+
+from aiohttp import ClientSession, ClientTimeout, TCPConnector
+
+from tgbot.config import RapidApiConfig
+from tgbot.misc.rapidapi_keys import RapidApiKeyPool
+
+
+class RapidApiClient:
+    """
+    Долгоживущий клиент rapidapi. Держит одну сессию aiohttp с пулом keep-alive соединений
+    и кэшем DNS, чтобы не открывать новое TCP/TLS соединение на каждый запрос.
+    Также владеет пулом ключей rapidapi
+    """
+    def __init__(self, config: RapidApiConfig):
+        self.config: RapidApiConfig = config
+        self.keys: RapidApiKeyPool = RapidApiKeyPool(keys=config.keys, cooldown=config.key_cooldown)
+        self._session: Optional[ClientSession] = None
+
+    async def start(self):
+        """ Создает пул соединений и сессию. Вызывается при запуске бота """
+        connector = TCPConnector(limit=self.config.connections_limit,
+                                 limit_per_host=self.config.connections_per_host,
+                                 ttl_dns_cache=self.config.dns_cache_ttl,
+                                 keepalive_timeout=self.config.keepalive_timeout)
+        timeout = ClientTimeout(total=self.config.timeout, connect=self.config.connect_timeout)
+        self._session = ClientSession(connector=connector, timeout=timeout)
+
+    @property
+    def session(self) -> ClientSession:
+        """ Возвращает открытую сессию клиента """
+        if self._session is None or self._session.closed:
+            raise RuntimeError('RapidApi client is not started')
+        return self._session
+
+    async def close(self):
+        """ Закрывает сессию и все соединения пула. Вызывается при остановке бота """
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+_client: Optional[RapidApiClient] = None
+
+
+async def setup_rapidapi_client(config: RapidApiConfig) -> RapidApiClient:
+    """ Создает и запускает общий для всего процесса клиент rapidapi """
+    global _client
+    _client = RapidApiClient(config=config)
+    await _client.start()
+    return _client
+
+
+def get_rapidapi_client() -> RapidApiClient:
+    """ Возвращает общий клиент rapidapi, созданный при запуске бота """
+    if _client is None:
+        raise RuntimeError('RapidApi client is not set up')
+    return _client
+
+
+async def close_rapidapi_client():
+    """ Закрывает общий клиент rapidapi """
+    global _client
+    if _client is not None:
+        await _client.close()
+    _client = None
@@ -0,0 +1,30 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable
+
+
+class SingleFlight:
+    """
+    Объединяет одинаковые одновременные запросы: пока запрос с тем же ключом выполняется,
+    новые вызовы ждут его результат вместо отправки собственного запроса.
+    Результат общий для всех ожидающих, поэтому его нельзя изменять
+    """
+    def __init__(self):
+        self._calls: dict[Hashable, asyncio.Future] = dict()
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: Hashable, request: Callable[[], Awaitable[Any]]) -> Any:
+        """ Выполняет запрос или присоединяется к уже выполняющемуся запросу с тем же ключом """
+        call = self._calls.get(key)
+        if call is None:
+            call = asyncio.ensure_future(request())
+            self._calls[key] = call
+            call.add_done_callback(lambda done_call: self._forget(key, done_call))
+        # shield не дает отмене одного из ожидающих отменить запрос для остальных
+        return await asyncio.shield(call)
+
+    def _forget(self, key: Hashable, call: asyncio.Future):
+        """ Удаляет завершенный запрос из списка выполняющихся """
+        if self._calls.get(key) is call:
+            del self._calls[key]
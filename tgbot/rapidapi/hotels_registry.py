@@ -0,0 +1,66 @@
+from collections import OrderedDict
+from typing import Optional
+
+from tgbot.config import load_config
+from tgbot.misc.named_tuples import HotelInfo, ID, KM, Link, USD
+
+
+class HotelRecord:
+    """ Компактная запись о неизменной информации отеля. Цены зависят от поиска и хранятся у пользователя """
+    __slots__ = ('hotel_id', 'name', 'stars', 'address', 'distance_from_center', 'photo', 'latitude', 'longitude')
+
+    def __init__(self, hotel: HotelInfo):
+        self.hotel_id: ID = hotel.hotel_id
+        self.name: str = hotel.name
+        self.stars: int = hotel.stars
+        self.address: str = hotel.address
+        self.distance_from_center: KM = hotel.distance_from_center
+        self.photo: Link = hotel.photo
+        self.latitude, self.longitude = hotel.coordinates
+
+    def to_hotel_info(self, total_cost: USD, cost_by_night: USD) -> HotelInfo:
+        """ Создает информацию об отеле с ценами конкретного поиска """
+        return HotelInfo(hotel_id=self.hotel_id, name=self.name, stars=self.stars, address=self.address,
+                         distance_from_center=self.distance_from_center, total_cost=total_cost,
+                         cost_by_night=cost_by_night, photo=self.photo, coordinates=(self.latitude, self.longitude))
+
+
+class HotelsRegistry:
+    """
+    Общий для всех пользователей реестр найденных отелей по идентификатору.
+    Ограничен по размеру, давно не использованные отели вытесняются
+    """
+    def __init__(self, maxsize: int):
+        self.maxsize: int = maxsize
+        self._hotels: OrderedDict[ID, HotelRecord] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._hotels)
+
+    def add(self, hotels: list[HotelInfo]):
+        """ Добавляет отели в реестр """
+        for hotel in hotels:
+            self._hotels[hotel.hotel_id] = HotelRecord(hotel)
+            self._hotels.move_to_end(hotel.hotel_id)
+        while len(self._hotels) > self.maxsize:
+            self._hotels.popitem(last=False)
+
+    def get(self, hotel_id: ID, total_cost: USD, cost_by_night: USD) -> Optional[HotelInfo]:
+        """ Возвращает информацию об отеле с ценами поиска или None, если отель вытеснен из реестра """
+        record = self._hotels.get(hotel_id)
+        if record is None:
+            return None
+        self._hotels.move_to_end(hotel_id)
+        return record.to_hotel_info(total_cost=total_cost, cost_by_night=cost_by_night)
+
+
+def hotels_to_session(hotels: list[HotelInfo]) -> dict:
+    """ Возвращает данные страницы отелей для состояния пользователя: идентификаторы отелей и цены поиска """
+    return {
+        'hotel_ids': [hotel.hotel_id for hotel in hotels],
+        'hotel_costs': [[hotel.total_cost, hotel.cost_by_night] for hotel in hotels],
+    }
+
+
+config = load_config(".env")
+hotels_registry = HotelsRegistry(maxsize=config.cache.hotels_registry_maxsize)
@@ -1,17 +1,60 @@
+import unicodedata
 from asyncio.exceptions import TimeoutError
 from datetime import date
 from typing import Union
 
-from aiohttp import ClientSession, ClientTimeout, ServerTimeoutError
+from aiohttp import ServerTimeoutError
 
+from tgbot.config import load_config
 from tgbot.keyboards.inline import create_cities_markup, create_hotel_keyboard
 from tgbot.misc.named_tuples import CitiesMessage, HotelInfo, HotelMessage
 from tgbot.misc.named_tuples import ID
 from tgbot.misc.rapidapi_exceptions import ResponseIsEmptyError
-from tgbot.misc.rapidapi_keys import get_headers_by_correct_rapidapi_key, change_rapid_api_key
+from tgbot.misc.rapidapi_keys import RapidApiKey, get_headers_by_rapidapi_key
+from tgbot.misc.ttl_cache import TTLCache
+from tgbot.rapidapi.client import get_rapidapi_client
+from tgbot.rapidapi.coalescing import SingleFlight
+from tgbot.rapidapi.json_decoding import Decoder, loads, select_hotels_fields
+from tgbot.rapidapi.page_cache import get_cached_page, cache_page
+
+CITIES_LOCALE = 'ru_RU'
+
+config = load_config(".env")
+cities_cache = TTLCache(maxsize=config.cache.cities_maxsize, ttl=config.cache.cities_ttl)
+in_flight_requests = SingleFlight()
 
 
 async def find_cities(city: str) -> dict:
+    """
+    Возвращает dict, где ключами являются названия городов, а значениями - идентификаторы городов.
+    Результаты поиска кэшируются по нормализованному запросу. Если города не найдены,
+    результат кэшируется на более короткое время
+    """
+    cache_key = normalize_city_query(city=city, locale=CITIES_LOCALE)
+    cached_cities: dict = cities_cache.get(cache_key)
+    if cached_cities is not None:
+        return dict(cached_cities)
+    cities_dict = await search_cities(city=city)
+    error = cities_dict.get('error')
+    if error is None:
+        cities_cache.set(cache_key, cities_dict)
+    elif error == 'cities_not_found':
+        cities_cache.set(cache_key, cities_dict, ttl=config.cache.cities_negative_ttl)
+    return dict(cities_dict)
+
+
+def normalize_city_query(city: str, locale: str) -> tuple[str, str]:
+    """
+    Нормализует запрос с названием города для ключа кэша: приводит юникод к единой форме,
+    убирает лишние пробелы и регистр. Для русской локали буква "ё" приравнивается к "е"
+    """
+    query = ' '.join(unicodedata.normalize('NFKC', city).split()).casefold()
+    if locale.startswith('ru'):
+        query = query.replace('ё', 'е')
+    return locale, query
+
+
+async def search_cities(city: str) -> dict:
     """
     Анализирует ответ json, чтобы получить cities dict.
     Возвращает dict, где ключами являются названия городов, а значениями - идентификаторы городов
@@ -30,23 +73,45 @@ async def find_cities(city: str) -> dict:
     return cities_with_id
 
 
-async def request_to_api(url: str, querystring: dict) -> dict:
-    """ Базовая функция, которая отправляет запрос в rapidapi с помощью методов aiohttp """
-    timeout = ClientTimeout(total=10)
-    try:
-        async with ClientSession(timeout=timeout) as session:
-            async with session.get(url=url,
-                                   headers=get_headers_by_correct_rapidapi_key(),
-                                   params=querystring) as response:
+async def request_to_api(url: str, querystring: dict, decode: Decoder = loads) -> dict:
+    """
+    Базовая функция запроса в rapidapi. Одинаковые одновременные запросы (тот же url и querystring)
+    объединяются в один запрос, результат которого получают все вызвавшие
+    """
+    request_key = (url, tuple(sorted((key, str(value)) for key, value in querystring.items())))
+    return await in_flight_requests.do(request_key,
+                                       lambda: send_request_to_api(url=url, querystring=querystring, decode=decode))
+
+
+async def send_request_to_api(url: str, querystring: dict, decode: Decoder = loads) -> dict:
+    """
+    Отправляет запрос в rapidapi через общую сессию клиента. Тело ответа читается байтами
+    и декодируется переданной функцией.
+    Если ключ исчерпал лимит запросов, повторяет запрос с другим ключом из пула.
+    Если исчерпаны все ключи, возвращает словарь с ошибкой rate_limited
+    """
+    client = get_rapidapi_client()
+    tried_keys: list[RapidApiKey] = list()
+    while True:
+        api_key = client.keys.choose(exclude=tried_keys)
+        if api_key is None:
+            return {'error': 'rate_limited'}
+        tried_keys.append(api_key)
+        try:
+            async with client.session.get(url=url,
+                                          headers=get_headers_by_rapidapi_key(api_key),
+                                          params=querystring) as response:
+                client.keys.update_from_headers(api_key, response.headers)
                 if response.ok:
-                    response_json = await response.json()
+                    response_json = decode(await response.read())
                     return response_json
-                if response.status == 429:
-                    change_rapid_api_key()
-    except ServerTimeoutError:
-        return {'error': 'timeout'}
-    except TimeoutError:
-        return {'error': 'timeout'}
+                if response.status != 429:
+                    return None
+                client.keys.cool_down(api_key, response.headers)
+        except ServerTimeoutError:
+            return {'error': 'timeout'}
+        except TimeoutError:
+            return {'error': 'timeout'}
 
 
 async def trying_to_get_cities_dict(city: str) -> dict:
@@ -68,8 +133,8 @@ async def get_cities_json(city: str) -> dict:
     Отправляет поисковый запрос в rapidapi
     по названию выбранного города. Возвращает json найденных городов
     """
-    url = "https://hotels4.p.rapidapi.com/locations/v2/search"
-    querystring = {"query": city, "locale": "ru_RU", "currency": "RUB"}
+    url = f'{config.rapidapi.base_url}/locations/v2/search'
+    querystring = {"query": city, "locale": CITIES_LOCALE, "currency": "RUB"}
     cities_json = await request_to_api(url=url, querystring=querystring)
     if cities_json is None:
         raise ResponseIsEmptyError
@@ -81,12 +146,12 @@ async def get_hotels_json(destination_id: str, date_in: date, date_out: date, so
     Отправляет поисковый запрос в rapidapi
     по выбранному идентификатору города. Возвращает json найденных отелей
     """
-    url = "https://hotels4.p.rapidapi.com/properties/list"
+    url = f'{config.rapidapi.base_url}/properties/list'
     querystring = {"destinationId": destination_id, "pageNumber": str(page), "pageSize": "25",
                    "checkIn": str(date_in), "checkOut": str(date_out), "adults1": "1",
                    "sortOrder": sort_by, "locale": "en_US",
                    "currency": "USD", 'landmarkIds': 'City center'}
-    hotels_json = await request_to_api(url=url, querystring=querystring)
+    hotels_json = await request_hotels_page(url=url, querystring=querystring)
     if hotels_json is None:
         raise ResponseIsEmptyError
     return hotels_json
@@ -98,23 +163,38 @@ async def get_bestdeal_hotels_json(destination_id: str, date_in: date, date_out:
     Отправляет поисковый запрос с пользовательскими параметрами в rapidapi
     по выбранному идентификатору города. Возвращает json найденных отелей
     """
-    url = "https://hotels4.p.rapidapi.com/properties/list"
+    url = f'{config.rapidapi.base_url}/properties/list'
     querystring = {"destinationId": destination_id, "pageNumber": str(page), "pageSize": "25",
                    "checkIn": str(date_in), "checkOut": str(date_out), "adults1": "1",
                    "priceMin": str(min_price), "priceMax": str(max_price), "sortOrder": "DISTANCE_FROM_LANDMARK",
                    "locale": "en_US", "currency": "USD", "landmarkIds": "City center"}
-    hotels_json = await request_to_api(url=url, querystring=querystring)
+    hotels_json = await request_hotels_page(url=url, querystring=querystring)
     if hotels_json is None:
         raise ResponseIsEmptyError
     return hotels_json
 
 
+async def request_hotels_page(url: str, querystring: dict) -> dict:
+    """
+    Возвращает страницу отелей из общего кэша, а если ее там нет - запрашивает в rapidapi
+    и сохраняет успешный ответ в кэш. При выборочном разборе у отелей остаются только нужные поля
+    """
+    hotels_json = await get_cached_page(url=url, querystring=querystring)
+    if hotels_json is not None:
+        return hotels_json
+    decode = select_hotels_fields if config.rapidapi.selective_parsing else loads
+    hotels_json = await request_to_api(url=url, querystring=querystring, decode=decode)
+    if hotels_json is not None and hotels_json.get('result') == 'OK':
+        await cache_page(url=url, querystring=querystring, page=hotels_json, ttl=config.cache.hotels_page_ttl)
+    return hotels_json
+
+
 async def get_hotel_photos_json(hotel_id: ID) -> dict:
     """
     Отправляет запрос на поиск в rapidapi по выбранному идентификатору отеля.
     Возвращает json найденных фотографий
     """
-    url = "https://hotels4.p.rapidapi.com/properties/get-hotel-photos"
+    url = f'{config.rapidapi.base_url}/properties/get-hotel-photos'
     querystring = {"id": str(hotel_id)}
     photos_json = await request_to_api(url=url, querystring=querystring)
     if photos_json is None:
@@ -0,0 +1,109 @@
+import json
+from typing import Any, Callable, Optional
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+Decoder = Callable[[bytes], Any]
+
+HOTELS_RESULTS_PATH = 'data.body.searchResults.results'
+HOTELS_RESULTS_PREFIX = HOTELS_RESULTS_PATH + '.item'
+STREAMING_MIN_BYTES = 1024 * 1024
+
+
+def loads(body: bytes) -> Any:
+    """ Декодирует JSON из байтов ответа. Использует orjson, если он установлен """
+    if orjson is not None:
+        return orjson.loads(body)
+    return json.loads(body)
+
+
+def dumps(obj: Any) -> bytes:
+    """ Кодирует объект в компактный JSON. Использует orjson, если он установлен """
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False).encode()
+
+
+def project_hotel_result(result: dict) -> dict:
+    """ Оставляет в результате поиска отелей только поля, которые нужны для информации об отеле """
+    landmarks = result.get('landmarks') or [{}]
+    price = (result.get('ratePlan') or {}).get('price') or {}
+    address = result.get('address') or {}
+    coordinate = result.get('coordinate') or {}
+    projected = {
+        'id': result.get('id'),
+        'name': result.get('name'),
+        'starRating': result.get('starRating'),
+        'address': {key: address.get(key) for key in ('countryName', 'locality', 'streetAddress')},
+        'landmarks': [{'distance': landmarks[0].get('distance')}],
+        'ratePlan': {'price': {'exactCurrent': price.get('exactCurrent')}},
+        'coordinate': {'lat': coordinate.get('lat'), 'lon': coordinate.get('lon')},
+    }
+    if result.get('optimizedThumbUrls') is not None:
+        projected['optimizedThumbUrls'] = {'srpDesktop': result['optimizedThumbUrls'].get('srpDesktop')}
+    return projected
+
+
+def hotels_page(result: Any, results: list[dict]) -> dict:
+    """ Собирает страницу отелей в формате ответа properties/list только с нужными полями """
+    return {'result': result, 'data': {'body': {'searchResults': {'results': results}}}}
+
+
+def find_hotels_results(page: dict) -> Optional[list]:
+    """ Возвращает результаты поиска со страницы properties/list или None, если страница другого формата """
+    try:
+        results = page.get('data').get('body').get('searchResults').get('results')
+    except AttributeError:
+        return None
+    return results if isinstance(results, list) else None
+
+
+def stream_hotels_page(body: bytes) -> dict:
+    """
+    Разбирает ответ properties/list потоково (ijson) за один проход: результаты поиска собираются по одному,
+    и из каждого сразу оставляются только нужные поля. Ответ с ошибкой или без результатов декодируется целиком
+    """
+    result, results, builder = None, None, None
+    for prefix, event, value in ijson.parse(body, use_float=True):
+        if builder is not None:
+            builder.event(event, value)
+            if prefix == HOTELS_RESULTS_PREFIX and event == 'end_map':
+                results.append(project_hotel_result(builder.value))
+                builder = None
+        elif prefix == HOTELS_RESULTS_PREFIX and event == 'start_map':
+            builder = ijson.ObjectBuilder()
+            builder.event(event, value)
+        elif prefix == HOTELS_RESULTS_PATH and event == 'start_array':
+            results = list()
+        elif prefix == 'result':
+            result = value
+            if result != 'OK':
+                return loads(body)
+    if result != 'OK' or results is None:
+        return loads(body)
+    return hotels_page(result=result, results=results)
+
+
+def select_hotels_fields(body: bytes) -> dict:
+    """
+    Декодирует ответ properties/list, оставляя у отелей только нужные поля.
+    Большие ответы разбираются потоково, если установлен ijson: так в памяти не держится весь ответ.
+    Обычные страницы быстрее декодировать целиком и отбросить лишнее
+    """
+    if ijson is not None and len(body) >= STREAMING_MIN_BYTES:
+        return stream_hotels_page(body)
+    page = loads(body)
+    if not isinstance(page, dict) or page.get('result') != 'OK':
+        return page
+    results = find_hotels_results(page)
+    if results is None:
+        return page
+    return hotels_page(result=page.get('result'), results=list(map(project_hotel_result, results)))
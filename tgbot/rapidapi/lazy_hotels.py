@@ -0,0 +1,80 @@
+from collections import deque
+from typing import Iterator, Optional, Union
+
+from tgbot.config import load_config
+from tgbot.misc.named_tuples import HotelInfo
+from tgbot.misc.ttl_cache import TTLCache
+from tgbot.rapidapi.parse_responses import get_hotels_results, is_last_page, iter_hotels_info
+
+config = load_config(".env")
+
+StorageKey = tuple[int, int]
+
+
+class LazyHotelsPage:
+    """
+    Страница найденных отелей, информация о которых создается по мере просмотра.
+    Хранит только еще не разобранные результаты поиска и разбирает те отели, до которых дошел пользователь
+    """
+    def __init__(self, results: list[dict], data: dict):
+        self.size: int = len(results)
+        self.is_last: bool = is_last_page(results)
+        self.hotels: list[HotelInfo] = list()
+        self._results: deque[dict] = deque(results)
+        self._unparsed = iter_hotels_info(results=pop_results(self._results),
+                                          date_in=data.get('date_in'), date_out=data.get('date_out'))
+
+    def get(self, index: int) -> Optional[HotelInfo]:
+        """ Возвращает отель страницы по номеру или None, если отели на странице закончились """
+        while len(self.hotels) <= index:
+            hotel = next(self._unparsed, None)
+            if hotel is None:
+                return None
+            self.hotels.append(hotel)
+        return self.hotels[index]
+
+
+def pop_results(results: deque[dict]) -> Iterator[dict]:
+    """ Отдает результаты поиска по одному, удаляя их из очереди, чтобы разобранные результаты не хранились """
+    while results:
+        yield results.popleft()
+
+
+async def load_lazy_hotels_page(data: dict, page: int) -> Union[LazyHotelsPage, dict]:
+    """ Загружает страницу отелей без разбора результатов или возвращает словарь с ошибкой """
+    results = await get_hotels_results(data=data, page=page)
+    if isinstance(results, dict):
+        return results
+    return LazyHotelsPage(results=results, data=data)
+
+
+class LazyHotelsPages:
+    """
+    Страницы отелей, которые сейчас просматривают пользователи.
+    Хранится не больше maxsize страниц, страница забывается через ttl секунд после последнего обращения
+    """
+    def __init__(self, maxsize: int, ttl: float):
+        self._pages = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def has(self, key: StorageKey) -> bool:
+        """ Проверяет, есть ли у пользователя страница """
+        return self._pages.get(key) is not None
+
+    def get(self, key: StorageKey) -> Optional[LazyHotelsPage]:
+        """ Возвращает страницу пользователя """
+        return self._pages.get(key)
+
+    def set(self, key: StorageKey, page: LazyHotelsPage):
+        """ Запоминает новую страницу пользователя вместо предыдущей """
+        self._pages.set(key, page)
+
+    def cancel(self, key: StorageKey):
+        """ Забывает страницу пользователя """
+        self._pages.pop(key)
+
+    def cancel_all(self):
+        """ Забывает все страницы. Вызывается при остановке бота """
+        self._pages.clear()
+
+
+lazy_hotels_pages = LazyHotelsPages(maxsize=config.search.lazy_pages_maxsize, ttl=config.search.lazy_pages_ttl)
@@ -0,0 +1,48 @@
+import hashlib
+import logging
+import zlib
+from typing import Optional
+from urllib.parse import urlencode
+
+from tgbot.database.redis_client import get_redis
+from tgbot.rapidapi.json_decoding import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+PAGE_CACHE_PREFIX = 'hotels_page:'
+
+
+def page_cache_key(url: str, querystring: dict) -> str:
+    """ Создает ключ кэша по адресу запроса и нормализованной (отсортированной) строке запроса """
+    normalized_query = urlencode(sorted((str(key), str(value)) for key, value in querystring.items()))
+    digest = hashlib.sha1(f'{url}?{normalized_query}'.encode()).hexdigest()
+    return PAGE_CACHE_PREFIX + digest
+
+
+async def get_cached_page(url: str, querystring: dict) -> Optional[dict]:
+    """ Возвращает страницу отелей из общего кэша или None, если страницы нет в кэше """
+    redis = get_redis()
+    if redis is None:
+        return None
+    from aioredis import RedisError
+    try:
+        compressed_page = await redis.get(page_cache_key(url, querystring))
+    except RedisError as error:
+        logger.warning('Hotels page cache is unavailable: %s', error)
+        return None
+    if compressed_page is None:
+        return None
+    return loads(zlib.decompress(compressed_page))
+
+
+async def cache_page(url: str, querystring: dict, page: dict, ttl: float):
+    """ Сохраняет сжатую страницу отелей в общий кэш """
+    redis = get_redis()
+    if redis is None:
+        return
+    from aioredis import RedisError
+    compressed_page = zlib.compress(dumps(page))
+    try:
+        await redis.set(page_cache_key(url, querystring), compressed_page, px=int(ttl * 1000))
+    except RedisError as error:
+        logger.warning('Hotels page cache is unavailable: %s', error)
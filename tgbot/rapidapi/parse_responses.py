@@ -1,18 +1,39 @@
+import asyncio
+import heapq
+import logging
 from datetime import date
-from typing import Union
+from typing import Iterable, Iterator, Union
 
+import numpy as np
 from aiogram.types import Message
-from aiogram.utils.exceptions import InvalidHTTPUrlContent, WrongFileIdentifier, BadRequest
+from aiogram.utils.exceptions import BadRequest
 
-from tgbot.misc.named_tuples import HotelInfo, ID, USD, HotelMessage
+from tgbot.config import load_config
+from tgbot.database.photo_ids import resolve_photo, send_resolved_photo
+from tgbot.misc.named_tuples import HotelInfo, ID, USD, HotelMessage, BestDealPage, RankingWeights
 from tgbot.misc.named_tuples import KM, Link
 from tgbot.misc.rapidapi_exceptions import ResponseIsEmptyError, BadRapidapiResultError, HotelsNotFoundError
 from tgbot.rapidapi.hotels_request import get_hotel_photos_json
 from tgbot.rapidapi.hotels_request import get_hotels_json, get_bestdeal_hotels_json
+from tgbot.rapidapi.json_decoding import find_hotels_results
+
+logger = logging.getLogger(__name__)
+
+config = load_config(".env")
 
 
 async def get_hotels_info(data: dict, page: int) -> Union[list[HotelInfo], dict]:
     """ Получает необходимую информацию для запроса из данных. Функция анализа вызовов отелей """
+    if is_ranked_search(data):
+        return await get_ranked_hotels_info(data=data)
+    results = await get_hotels_results(data=data, page=page)
+    if isinstance(results, dict):
+        return results
+    return parse_hotels_info(results=results, date_in=data.get('date_in'), date_out=data.get('date_out'))
+
+
+async def get_hotels_results(data: dict, page: int) -> Union[list[dict], dict]:
+    """ Получает необработанные результаты поиска отелей на странице или словарь с ошибкой """
     command = data.get('command_type')
     if command == 'bestdeal':
         hotels_dict = await get_bestdeal_hotels_dict(data=data, page=page)
@@ -21,13 +42,9 @@ async def get_hotels_info(data: dict, page: int) -> Union[list[HotelInfo], dict]
     if hotels_dict.get('error') is not None:
         return hotels_dict
     try:
-        date_in, date_out = data.get('date_in'), data.get('date_out')
         if command == 'bestdeal':
-            results = trying_to_get_bestdeal_results(hotels=hotels_dict, max_distance=data.get('max_distance'))
-        else:
-            results = trying_to_get_results(hotels=hotels_dict)
-
-        return parse_hotels_info(results=results, date_in=date_in, date_out=date_out)
+            return trying_to_get_bestdeal_results(hotels=hotels_dict, max_distance=data.get('max_distance'))
+        return trying_to_get_results(hotels=hotels_dict)
     except HotelsNotFoundError:
         return {'error': 'hotels_not_found'}
     except BadRapidapiResultError:
@@ -47,6 +64,122 @@ async def get_bestdeal_hotels_dict(data: dict, page: int):
         return {'error': 'empty'}
 
 
+async def fetch_bestdeal_page(data: dict, page: int) -> Union[BestDealPage, dict]:
+    """
+    Загружает страницу отелей, отсортированных по расстоянию, и оставляет отели не дальше максимального расстояния.
+    Страница последняя, если на ней закончились отели или подходящие по расстоянию отели
+    """
+    hotels_dict = await get_bestdeal_hotels_dict(data=data, page=page)
+    if hotels_dict.get('error') is not None:
+        return hotels_dict
+    try:
+        results = trying_to_get_results(hotels=hotels_dict)
+    except BadRapidapiResultError:
+        return {'error': 'bad_result'}
+    hotels_within_distance = count_results_within_distance(results=results, max_distance=data.get('max_distance'))
+    hotels = parse_hotels_info(results=results[:hotels_within_distance],
+                               date_in=data.get('date_in'), date_out=data.get('date_out'))
+    is_last = not results or hotels_within_distance < len(results) or is_last_page(results)
+    return BestDealPage(hotels=hotels, is_last=is_last)
+
+
+def is_ranked_search(data: dict) -> bool:
+    """ Проверяет, выбирает ли поиск лучшие отели по оценке среди нескольких страниц """
+    return data.get('command_type') == 'bestdeal' and bool(data.get('min_stars'))
+
+
+async def get_ranked_hotels_info(data: dict) -> Union[list[HotelInfo], dict]:
+    """
+    Загружает до RANKING_PAGES страниц отелей, отсортированных по расстоянию, по BESTDEAL_FANOUT страниц одновременно
+    и возвращает RANKING_TOP_K лучших по оценке отелей, подходящих под условия пользователя
+    """
+    hotels: dict[ID, HotelInfo] = dict()
+    pages_amount, fanout = config.search.ranking_pages, config.search.bestdeal_fanout
+    for first_page in range(1, pages_amount + 1, fanout):
+        pages = range(first_page, min(first_page + fanout, pages_amount + 1))
+        bestdeal_pages = await asyncio.gather(*(fetch_bestdeal_page(data=data, page=page) for page in pages))
+        is_finished = False
+        for bestdeal_page in bestdeal_pages:
+            if isinstance(bestdeal_page, dict):
+                if not hotels:
+                    return bestdeal_page
+                is_finished = True
+                break
+            for hotel in bestdeal_page.hotels:
+                hotels.setdefault(hotel.hotel_id, hotel)
+            if bestdeal_page.is_last:
+                is_finished = True
+                break
+        if is_finished:
+            break
+    weights = RankingWeights(price=config.search.ranking_price_weight,
+                             distance=config.search.ranking_distance_weight,
+                             stars=config.search.ranking_stars_weight)
+    ranked_hotels = rank_hotels(hotels=list(hotels.values()), data=data, weights=weights,
+                                top_k=config.search.ranking_top_k)
+    if not ranked_hotels:
+        return {'error': 'hotels_not_found'}
+    return ranked_hotels
+
+
+class HotelsTable:
+    """
+    Колоночная таблица отелей: цена за ночь, полная стоимость, расстояние и звезды хранятся в массивах NumPy,
+    поэтому фильтры и оценка вычисляются сразу для всех отелей
+    """
+    def __init__(self, hotels: list[HotelInfo]):
+        self.hotels: list[HotelInfo] = hotels
+        self.price = np.array([hotel.cost_by_night for hotel in hotels], dtype=np.float64)
+        self.total_cost = np.array([hotel.total_cost for hotel in hotels], dtype=np.float64)
+        self.distance = np.array([hotel.distance_from_center for hotel in hotels], dtype=np.float64)
+        self.stars = np.array([hotel.stars for hotel in hotels], dtype=np.float64)
+
+    def filter(self, min_price: float = None, max_price: float = None,
+               max_distance: float = None, min_stars: int = None) -> np.ndarray:
+        """ Возвращает номера отелей, подходящих под все заданные условия """
+        mask = np.ones(len(self.hotels), dtype=bool)
+        if min_price is not None:
+            mask &= self.price >= min_price
+        if max_price is not None:
+            mask &= self.price <= max_price
+        if max_distance is not None:
+            mask &= self.distance <= max_distance
+        if min_stars is not None:
+            mask &= self.stars >= min_stars
+        return np.flatnonzero(mask)
+
+    def scores(self, indexes: np.ndarray, weights: RankingWeights) -> np.ndarray:
+        """
+        Возвращает оценку отелей с заданными номерами: чем меньше, тем лучше.
+        Цена, расстояние и звезды приводятся к диапазону от 0 до 1 среди этих отелей
+        """
+        return (weights.price * normalize(self.price[indexes])
+                + weights.distance * normalize(self.distance[indexes])
+                + weights.stars * (1 - normalize(self.stars[indexes])))
+
+
+def normalize(column: np.ndarray) -> np.ndarray:
+    """ Приводит значения к диапазону от 0 до 1. Если все значения одинаковые, возвращает нули """
+    if column.size == 0:
+        return column
+    span = column.max() - column.min()
+    if span == 0:
+        return np.zeros_like(column)
+    return (column - column.min()) / span
+
+
+def rank_hotels(hotels: list[HotelInfo], data: dict, weights: RankingWeights, top_k: int) -> list[HotelInfo]:
+    """ Отбирает отели, подходящие под условия пользователя, и возвращает top_k лучших из них по оценке """
+    table = HotelsTable(hotels)
+    indexes = table.filter(min_price=data.get('min_price'), max_price=data.get('max_price'),
+                           max_distance=data.get('max_distance'), min_stars=data.get('min_stars'))
+    if indexes.size == 0:
+        return []
+    scores = table.scores(indexes=indexes, weights=weights)
+    best = heapq.nsmallest(top_k, zip(scores.tolist(), indexes.tolist()))
+    return [hotels[index] for _, index in best]
+
+
 async def get_hotels_dict(command: str, data: dict, page: int) -> dict:
     """ Получает информацию об отелях из rapidapi """
     sort_by = 'PRICE' if command == 'lowprice' else 'PRICE_HIGHEST_FIRST'
@@ -62,33 +195,47 @@ async def get_hotels_dict(command: str, data: dict, page: int) -> dict:
 
 def parse_hotels_info(results: list[dict], date_in: date, date_out: date) -> list[HotelInfo]:
     """ Анализирует найденную информацию о каждом отеле. Возвращает список информации о каждом отеле """
-    hotels_info = list()
+    return list(iter_hotels_info(results=results, date_in=date_in, date_out=date_out))
+
+
+def iter_hotels_info(results: Iterable[dict], date_in: date, date_out: date) -> Iterator[HotelInfo]:
+    """
+    Лениво анализирует результаты поиска: информация об отеле создается, только когда она запрошена.
+    Результат, который не удалось разобрать, пропускается, остальные отели страницы остаются
+    """
+    days_in = (date_out - date_in).days
     for result in results:
-        name: str = result.get('name')
-        stars: int = int(result.get('starRating'))
-        address_info = result.get('address')
-        address: str = generate_address(info=address_info)
-        hotel_id: ID = result.get('id')
-        high_resolution_link: Link = trying_to_get_link(result)
-        distance_to_center = result.get('landmarks')[0].get('distance')
-        correct_distance: KM = distance_str_to_float_in_km(str_distance=distance_to_center)
-        days_in = (date_out - date_in).days
-        price_by_night: USD = result.get('ratePlan').get('price').get('exactCurrent')
-        total_price: USD = days_in * price_by_night
-
-        coordinates = (result.get('coordinate').get('lat'), result.get('coordinate').get('lon'))
-        hotels_info.append(HotelInfo(
-            hotel_id=hotel_id,
-            name=name,
-            stars=stars,
-            address=address,
-            distance_from_center=correct_distance,
-            total_cost=round(total_price, 2),
-            cost_by_night=round(price_by_night, 2),
-            photo=high_resolution_link,
-            coordinates=coordinates
-        ))
-    return hotels_info
+        try:
+            yield parse_hotel_info(result=result, days_in=days_in)
+        except (AttributeError, IndexError, KeyError, TypeError, ValueError) as error:
+            logger.warning('Skipped bad hotel result %s: %r', result.get('id'), error)
+
+
+def parse_hotel_info(result: dict, days_in: int) -> HotelInfo:
+    """ Анализирует найденную информацию об одном отеле """
+    name: str = result.get('name')
+    stars: int = int(result.get('starRating'))
+    address_info = result.get('address')
+    address: str = generate_address(info=address_info)
+    hotel_id: ID = result.get('id')
+    high_resolution_link: Link = trying_to_get_link(result)
+    distance_to_center = result.get('landmarks')[0].get('distance')
+    correct_distance: KM = distance_str_to_float_in_km(str_distance=distance_to_center)
+    price_by_night: USD = result.get('ratePlan').get('price').get('exactCurrent')
+    total_price: USD = days_in * price_by_night
+
+    coordinates = (result.get('coordinate').get('lat'), result.get('coordinate').get('lon'))
+    return HotelInfo(
+        hotel_id=hotel_id,
+        name=name,
+        stars=stars,
+        address=address,
+        distance_from_center=correct_distance,
+        total_cost=round(total_price, 2),
+        cost_by_night=round(price_by_night, 2),
+        photo=high_resolution_link,
+        coordinates=coordinates
+    )
 
 
 async def get_hotel_photo_links(hotel_id: ID) -> Union[list[Link], dict]:
@@ -109,16 +256,18 @@ async def get_hotel_photo_links(hotel_id: ID) -> Union[list[Link], dict]:
 async def trying_to_send_with_photo(message_from_user: Message, hotel_message: HotelMessage):
     """
     Пытается отправить сообщение об отеле с фотографией.
-    Если найдено исключение, отправляет без фотографии
+    Фотографии, уже загруженные в Telegram, отправляются по id. Если фотография недоступна, отправляет без нее
     """
+    photo = await resolve_photo(hotel_message.photo)
+    if photo is None:
+        return await message_from_user.answer(text=hotel_message.text, reply_markup=hotel_message.buttons)
+
+    async def send_photo(resolved_photo: str) -> Message:
+        return await message_from_user.bot.send_photo(chat_id=message_from_user.chat.id, photo=resolved_photo,
+                                                      caption=hotel_message.text, reply_markup=hotel_message.buttons)
+
     try:
-        message = await message_from_user.bot.send_photo(chat_id=message_from_user.chat.id, photo=hotel_message.photo,
-                                                         caption=hotel_message.text,
-                                                         reply_markup=hotel_message.buttons)
-    except InvalidHTTPUrlContent:
-        message = await message_from_user.answer(text=hotel_message.text, reply_markup=hotel_message.buttons)
-    except WrongFileIdentifier:
-        message = await message_from_user.answer(text=hotel_message.text, reply_markup=hotel_message.buttons)
+        message = await send_resolved_photo(send_photo, photo=hotel_message.photo, resolved_photo=photo)
     except BadRequest:
         message = await message_from_user.answer(text=hotel_message.text, reply_markup=hotel_message.buttons)
 
@@ -128,9 +277,9 @@ async def trying_to_send_with_photo(message_from_user: Message, hotel_message: H
 def trying_to_get_results(hotels: dict) -> list:
     """ Пытается получить результаты из словаря с информацией об отелях """
     if hotels.get('result') == 'OK':
-        search_results: dict = hotels.get('data').get('body').get('searchResults')
-        results: list = search_results.get('results')
-        return results
+        results = find_hotels_results(hotels)
+        if results is not None:
+            return results
     raise BadRapidapiResultError
 
 
@@ -142,17 +291,39 @@ def trying_to_get_bestdeal_results(hotels: dict, max_distance: int) -> list:
 
 def slice_hotels_results_by_max(results: list, max_distance: int):
     """ Срезает объекты отелей до отеля с максимальным расстоянием """
-    index = len(results) - 1
-    while index >= 0:
-        hotel = results[index]
-        distance_to_center = hotel.get('landmarks')[0].get('distance')
-        distance: KM = distance_str_to_float_in_km(str_distance=distance_to_center)
-        if distance <= max_distance:
-            break
-        index -= 1
-    if len(results[:index + 1]) == 0:
+    hotels_within_distance = count_results_within_distance(results=results, max_distance=max_distance)
+    if hotels_within_distance == 0:
         raise HotelsNotFoundError
-    return results[:index + 1]
+    return results[:hotels_within_distance]
+
+
+def count_results_within_distance(results: list, max_distance: int) -> int:
+    """
+    Возвращает количество отелей не дальше max_distance от центра.
+    Результаты отсортированы по расстоянию, поэтому используется бинарный поиск
+    """
+    low, high = 0, len(results)
+    while low < high:
+        middle = (low + high) // 2
+        if is_result_within_distance(results[middle], max_distance=max_distance):
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+
+def is_result_within_distance(result: dict, max_distance: int) -> bool:
+    """ Проверяет, не дальше ли отель max_distance от центра. Отель без расстояния считается слишком далеким """
+    try:
+        return get_result_distance(result) <= max_distance
+    except (AttributeError, IndexError, TypeError, ValueError) as error:
+        logger.warning('Bad distance of hotel result %s: %r', result.get('id'), error)
+        return False
+
+
+def get_result_distance(result: dict) -> KM:
+    """ Возвращает расстояние от отеля до центра в км """
+    return distance_str_to_float_in_km(str_distance=result.get('landmarks')[0].get('distance'))
 
 
 def distance_str_to_float_in_km(str_distance: str) -> float:
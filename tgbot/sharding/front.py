@@ -0,0 +1,93 @@
+import asyncio
+import logging
+from typing import Hashable, Optional
+
+from aiogram import Bot, Dispatcher, types
+from aiohttp import ClientError, ClientSession, ClientTimeout
+
+from tgbot.config import ShardingConfig
+from tgbot.sharding.hash_ring import HashRing
+from tgbot.sharding.ordering import ChatSequencer, update_chat_id
+from tgbot.sharding.worker import UPDATES_PATH, get_workers_health
+
+logger = logging.getLogger(__name__)
+
+FORWARD_TIMEOUT = 10
+WORKERS_STARTUP_TIMEOUT = 30
+
+
+class NoWorkersAvailableError(Exception):
+    """ Ни один процесс-обработчик не принял обновление """
+
+
+class UpdateRouter:
+    """
+    Распределяет обновления по процессам-обработчикам согласованным хешированием id чата.
+    Обновления одного чата всегда попадают в один процесс и пересылаются строго по очереди.
+    Недоступный процесс временно убирается с кольца, его чаты переходят к соседним процессам
+    """
+    def __init__(self, config: ShardingConfig):
+        self.config: ShardingConfig = config
+        self.ring = HashRing(nodes=config.worker_urls(), virtual_nodes=config.virtual_nodes)
+        self.sequencer = ChatSequencer()
+        self._session: Optional[ClientSession] = None
+
+    @property
+    def session(self) -> ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = ClientSession(timeout=ClientTimeout(total=FORWARD_TIMEOUT))
+        return self._session
+
+    async def wait_for_workers(self):
+        """ Ждет, пока запустятся все процессы-обработчики. Вызывается при запуске бота """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + WORKERS_STARTUP_TIMEOUT
+        while loop.time() < deadline:
+            workers_health = await get_workers_health(self.config.worker_urls())
+            if all(health is not None for health in workers_health):
+                logger.info('All %s workers are running', len(workers_health))
+                return
+            await asyncio.sleep(0.5)
+        logger.warning('Not all workers started in %s s', WORKERS_STARTUP_TIMEOUT)
+
+    async def forward(self, update: dict):
+        """ Пересылает обновление процессу, которому принадлежит его чат """
+        chat_id = update_chat_id(update)
+        key = chat_id if chat_id is not None else update.get('update_id')
+        await self.sequencer.run(chat_id, lambda: self._send(key=key, update=update))
+
+    async def _send(self, key: Hashable, update: dict):
+        while True:
+            worker = self.ring.node_for(key)
+            if worker is None:
+                raise NoWorkersAvailableError(f'Update {update.get("update_id")} was not delivered to any worker')
+            try:
+                async with self.session.post(worker + UPDATES_PATH, json=update) as response:
+                    response.raise_for_status()
+                return
+            except (ClientError, asyncio.TimeoutError) as error:
+                logger.warning('Worker %s is unavailable: %r', worker, error)
+                self.mark_down(worker)
+
+    def mark_down(self, worker: str):
+        """ Убирает процесс с кольца и возвращает его обратно через retry_after секунд """
+        if worker not in self.ring:
+            return
+        self.ring.remove(worker)
+        asyncio.get_running_loop().call_later(self.config.retry_after, self.ring.add, worker)
+
+    async def close(self):
+        """ Закрывает соединения с процессами-обработчиками """
+        if self._session is not None:
+            await self._session.close()
+        self._session = None
+
+
+class ForwardingDispatcher(Dispatcher):
+    """ Диспетчер основного процесса: не обрабатывает обновления сам, а пересылает их процессам-обработчикам """
+    def __init__(self, bot: Bot, router: UpdateRouter, **kwargs):
+        super().__init__(bot, **kwargs)
+        self.router: UpdateRouter = router
+
+    async def process_update(self, update: types.Update):
+        await self.router.forward(update.to_python())
@@ -0,0 +1,50 @@
+import bisect
+import hashlib
+from typing import Hashable, Optional
+
+
+def ring_hash(value: str) -> int:
+    """ Возвращает стабильный между процессами и запусками хеш строки """
+    return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], 'big')
+
+
+class HashRing:
+    """
+    Кольцо согласованного хеширования. Каждый узел занимает на кольце virtual_nodes точек,
+    поэтому ключи распределяются равномерно, а при удалении узла на другие узлы переходят только его ключи
+    """
+    def __init__(self, nodes: list[str], virtual_nodes: int):
+        self.virtual_nodes: int = virtual_nodes
+        self._hashes: list[int] = list()
+        self._nodes: list[str] = list()
+        for node in nodes:
+            self.add(node)
+
+    def __contains__(self, node: str) -> bool:
+        return node in self._nodes
+
+    def __len__(self) -> int:
+        return len(set(self._nodes))
+
+    def add(self, node: str):
+        """ Добавляет узел на кольцо """
+        if node in self._nodes:
+            return
+        for replica in range(self.virtual_nodes):
+            point = ring_hash(f'{node}#{replica}')
+            index = bisect.bisect(self._hashes, point)
+            self._hashes.insert(index, point)
+            self._nodes.insert(index, node)
+
+    def remove(self, node: str):
+        """ Удаляет узел с кольца """
+        points = [(point, ring_node) for point, ring_node in zip(self._hashes, self._nodes) if ring_node != node]
+        self._hashes = [point for point, _ in points]
+        self._nodes = [ring_node for _, ring_node in points]
+
+    def node_for(self, key: Hashable) -> Optional[str]:
+        """ Возвращает узел, которому принадлежит ключ, или None, если кольцо пустое """
+        if not self._hashes:
+            return None
+        index = bisect.bisect(self._hashes, ring_hash(str(key))) % len(self._hashes)
+        return self._nodes[index]
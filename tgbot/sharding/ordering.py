@@ -0,0 +1,47 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+
+def update_chat_id(update: dict) -> Optional[int]:
+    """
+    Возвращает id чата, к которому относится обновление Telegram в виде dict.
+    Для обновлений без чата (например, inline-запросов) возвращает id пользователя или None
+    """
+    for field, value in update.items():
+        if field == 'update_id' or not isinstance(value, dict):
+            continue
+        chat = value.get('chat') or (value.get('message') or {}).get('chat')
+        if chat is not None:
+            return chat.get('id')
+        sender = value.get('from') or value.get('user')
+        if sender is not None:
+            return sender.get('id')
+    return None
+
+
+class ChatSequencer:
+    """
+    Выполняет задачи одного чата строго по очереди, а задачи разных чатов - одновременно.
+    Хранит только последнюю задачу каждого чата, поэтому память не растет с количеством чатов
+    """
+    def __init__(self):
+        self._tails: dict[Hashable, asyncio.Future] = dict()
+
+    def __len__(self) -> int:
+        return len(self._tails)
+
+    async def run(self, key: Hashable, task: Callable[[], Awaitable[Any]]) -> Any:
+        """ Дожидается завершения предыдущих задач чата и выполняет задачу. Задачи без чата выполняются сразу """
+        if key is None:
+            return await task()
+        previous = self._tails.get(key)
+        current = asyncio.get_running_loop().create_future()
+        self._tails[key] = current
+        try:
+            if previous is not None:
+                await asyncio.shield(previous)
+            return await task()
+        finally:
+            current.set_result(None)
+            if self._tails.get(key) is current:
+                del self._tails[key]
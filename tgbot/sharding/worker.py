@@ -0,0 +1,97 @@
+import asyncio
+import logging
+import os
+import resource
+import time
+from typing import Optional
+
+from aiogram import Bot, Dispatcher, types
+from aiohttp import ClientError, ClientSession, ClientTimeout, web
+
+from tgbot.sharding.ordering import ChatSequencer, update_chat_id
+
+logger = logging.getLogger(__name__)
+
+UPDATES_PATH = '/updates'
+HEALTH_PATH = '/health'
+HEALTH_TIMEOUT = 2
+SHUTDOWN_TIMEOUT = 30
+
+
+class UpdatesWorker:
+    """
+    Процесс-обработчик обновлений. Принимает обновления от основного процесса по HTTP
+    и обрабатывает их диспетчером: обновления одного чата - по очереди, разных чатов - одновременно
+    """
+    def __init__(self, dispatcher: Dispatcher, worker_id: int):
+        self.dispatcher: Dispatcher = dispatcher
+        self.worker_id: int = worker_id
+        self.sequencer = ChatSequencer()
+        self.started_at: float = time.time()
+        self.processed: int = 0
+        self.failed: int = 0
+        self._tasks: set[asyncio.Task] = set()
+
+    def create_app(self) -> web.Application:
+        """ Создает веб-приложение процесса-обработчика """
+        app = web.Application()
+        app.router.add_post(UPDATES_PATH, self.handle_update)
+        app.router.add_get(HEALTH_PATH, self.handle_health)
+        return app
+
+    async def handle_update(self, request: web.Request) -> web.Response:
+        """ Ставит обновление в очередь его чата и сразу подтверждает получение """
+        data: dict = await request.json()
+        update = types.Update.to_object(data)
+        Dispatcher.set_current(self.dispatcher)
+        Bot.set_current(self.dispatcher.bot)
+        task = asyncio.create_task(self.sequencer.run(update_chat_id(data), lambda: self.process(update)))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return web.Response()
+
+    async def process(self, update: types.Update):
+        """ Обрабатывает обновление диспетчером """
+        try:
+            await self.dispatcher.process_update(update)
+        except Exception:
+            self.failed += 1
+            logger.exception('Update %s failed in worker %s', update.update_id, self.worker_id)
+        else:
+            self.processed += 1
+
+    async def handle_health(self, request: web.Request) -> web.Response:
+        return web.json_response(self.health())
+
+    def health(self) -> dict:
+        """ Возвращает состояние процесса-обработчика """
+        return {
+            'worker': self.worker_id,
+            'pid': os.getpid(),
+            'uptime': round(time.time() - self.started_at),
+            'processed': self.processed,
+            'failed': self.failed,
+            'in_progress': len(self._tasks),
+            'active_chats': len(self.sequencer),
+            'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        }
+
+    async def close(self):
+        """ Дожидается обработки принятых обновлений. Вызывается при остановке процесса """
+        if self._tasks:
+            await asyncio.wait(self._tasks, timeout=SHUTDOWN_TIMEOUT)
+
+
+async def get_workers_health(worker_urls: list[str]) -> list[Optional[dict]]:
+    """ Опрашивает процессы-обработчики. Вместо состояния недоступного процесса возвращает None """
+    async with ClientSession(timeout=ClientTimeout(total=HEALTH_TIMEOUT)) as session:
+
+        async def get_health(url: str) -> Optional[dict]:
+            try:
+                async with session.get(url + HEALTH_PATH) as response:
+                    response.raise_for_status()
+                    return await response.json()
+            except (ClientError, asyncio.TimeoutError):
+                return None
+
+        return list(await asyncio.gather(*map(get_health, worker_urls)))